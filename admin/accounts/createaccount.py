@@ -1,25 +1,10 @@
-import os
-import json
 from flask import Blueprint, request, jsonify
-from flask_bcrypt import Bcrypt
+from storage import ConflictError
+from storage.accounts import ACCOUNTS, find_by_email
+from storage.ids import next_id
+from services.passwords import hash_password, PasswordBusyError
 
 admin_createaccount_bp = Blueprint("createaccount", __name__)
-bcrypt = Bcrypt()
-
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json():
-    """Load accounts JSON file."""
-    if not os.path.exists(DB_PATH):
-        return {}
-    with open(DB_PATH, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(data):
-    """Save data to accounts JSON file."""
-    with open(DB_PATH, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
 
 @admin_createaccount_bp.route("/createaccounts", methods=["POST"])
 def create_account():
@@ -29,17 +14,18 @@ def create_account():
     if not data.get("name") or not data.get("email") or not data.get("password"):
         return jsonify({"error": "All fields are required"}), 400
 
-    accounts_db = load_json()
-
     # Check for duplicate email
-    if any(account["email"] == data["email"] for account in accounts_db.values()):
+    if find_by_email(data["email"]):
         return jsonify({"error": "Email already exists"}), 400
 
-    # Generate a new unique ID
-    account_id = str(len(accounts_db) + 1)
-
     # Hash password with bcrypt
-    hashed_password = bcrypt.generate_password_hash(data["password"]).decode("utf-8")
+    try:
+        hashed_password = hash_password(data["password"])
+    except PasswordBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+    # Generate a new unique ID
+    account_id = next_id(ACCOUNTS)
 
     # Create new user object
     new_account = {
@@ -55,8 +41,10 @@ def create_account():
     }
 
     # Save to database
-    accounts_db[account_id] = new_account
-    save_json(accounts_db)
+    try:
+        ACCOUNTS.put(account_id, new_account)
+    except ConflictError:
+        return jsonify({"error": "Email already exists"}), 400
 
     return jsonify({
         "message": "Account created successfully",
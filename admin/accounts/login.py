@@ -1,25 +1,13 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
-from flask_bcrypt import Bcrypt
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 import datetime
 import uuid
+from storage.accounts import find_by_email, is_disabled
+from services.auth import revoke
+from services.passwords import verify_login, PasswordBusyError
 
 # Initialize Blueprint
 admin_auth_bp = Blueprint("admin_auth", __name__)
-bcrypt = Bcrypt()
-
-# Database path
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json():
-    """Load accounts JSON file."""
-    if not os.path.exists(DB_PATH_ACCOUNTS):
-        return {}
-    with open(DB_PATH_ACCOUNTS, "r", encoding="utf-8") as file:
-        return json.load(file)
 
 @admin_auth_bp.route("/login", methods=["POST"])
 def admin_login():
@@ -35,15 +23,17 @@ def admin_login():
         if not email or not password:
             return jsonify({"error": "Missing email or password"}), 400
 
-        accounts_db = load_json()
-        user = next((user for user in accounts_db.values() if user.get("email") == email), None)
+        user = find_by_email(email)
 
-        if not user or not bcrypt.check_password_hash(user["password"], password):
+        if not user or not verify_login(str(user["id"]), user, password):
             return jsonify({"error": "Invalid email or password"}), 401
 
         if user.get("role") != "admin":
             return jsonify({"error": "Access denied. Admins only."}), 403
 
+        if is_disabled(user):
+            return jsonify({"error": "Account is disabled"}), 403
+
         # ✅ Generate JWT token for admin
         expires = datetime.timedelta(hours=24)
         token = create_access_token(
@@ -54,6 +44,8 @@ def admin_login():
 
         return jsonify({"token": token}), 200
 
+    except PasswordBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
@@ -61,4 +53,11 @@ def admin_login():
 @jwt_required()
 def get_current_user():
     """Retrieve authenticated user details."""
-    return jsonify(get_jwt_identity()), 200
\ No newline at end of file
+    return jsonify(get_jwt_identity()), 200
+
+@admin_auth_bp.route("/auth/logout", methods=["POST"])
+@jwt_required()
+def admin_logout():
+    """Revoke the admin token used for this request."""
+    revoke(get_jwt())
+    return jsonify({"message": "Logged out"}), 200
@@ -1,43 +1,27 @@
-import os
-import json
-import time
 from flask import Blueprint, jsonify, request
+from storage import get_collection
+from storage.accounts import usernames
+from storage.ids import next_id
 
 admin_reports_bp = Blueprint("reports", __name__)
 
-# Define the path to the database folder
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-
-# Define paths to individual database files
-DB_PATH_REPORTS = os.path.join(DB_FOLDER, "reports.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    """Load JSON data from file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
+REPORTS = get_collection("reports")
 
 @admin_reports_bp.route("/reports", methods=["GET"])
 def get_reports():
     """Retrieve all reports."""
     try:
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
-        reports_db = load_json(DB_PATH_REPORTS)
-
         reports = []
-        for report_id, report in reports_db.items():
+        all_reports = REPORTS.items()
+        names = usernames(
+            user_id for _, report in all_reports for user_id in (report.get("customerId"), report.get("reportedBy"))
+        )
+        for report_id, report in all_reports:
             reports.append({
                 "id": report_id,
                 "customerId": report.get("customerId"),
-                "customerName": accounts_db.get(report.get("customerId"), {}).get("username", "Unknown"),
-                "reportedBy": accounts_db.get(report.get("reportedBy"), {}).get("username", "Unknown"),
+                "customerName": names.get(str(report.get("customerId")), "Unknown"),
+                "reportedBy": names.get(str(report.get("reportedBy")), "Unknown"),
                 "reason": report.get("reason", "No reason provided"),
             })
 
@@ -55,11 +39,7 @@ def delete_report():
         if not report_id:
             return jsonify({"error": "Missing report ID"}), 400
 
-        reports_db = load_json(DB_PATH_REPORTS)
-
-        if report_id in reports_db:
-            del reports_db[report_id]
-            save_json(DB_PATH_REPORTS, reports_db)
+        if REPORTS.delete(report_id):
             return jsonify({"message": "Report deleted successfully"}), 200
 
         return jsonify({"error": "Report not found"}), 404
@@ -78,17 +58,15 @@ def create_report():
         if not customer_id or not reported_by or not reason:
             return jsonify({"error": "Missing required fields."}), 400
 
-        report_id = str(int(time.time()))
-        reports_db = load_json(DB_PATH_REPORTS)
-
-        reports_db[report_id] = {
+        report_id = next_id(REPORTS)
+        report = {
             "customerId": customer_id,
             "reportedBy": reported_by,
             "reason": reason
         }
 
-        save_json(DB_PATH_REPORTS, reports_db)
+        REPORTS.put(report_id, report)
 
-        return jsonify({"message": "Report created successfully!", "report": reports_db[report_id]}), 201
+        return jsonify({"message": "Report created successfully!", "report": report}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
@@ -1,55 +1,39 @@
-import os
-import json
 from flask import Blueprint, jsonify
+from storage import get_collection
+from storage.ids import id_order
+from storage.products import PRODUCTS
 
 admin_user_bp = Blueprint("user", __name__)
 
-# Define the path to the database folder
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-
-# Define paths to individual database files
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-DB_PATH_PRODUCTS = os.path.join(DB_FOLDER, "products.json")
-DB_PATH_WISHLIST = os.path.join(DB_FOLDER, "wishlist.json")
-DB_PATH_RATINGS = os.path.join(DB_FOLDER, "ratings.json")
+ACCOUNTS = get_collection("accounts")
+WISHLIST = get_collection("wishlist")
+RATINGS = get_collection("ratings")
 
 DEFAULT_PFP_URL = "/account.svg"
 
-def load_json(db_path):
-    """Load JSON data from file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
 @admin_user_bp.route("/user/<int:user_id>", methods=["GET"])
 def get_user_data(user_id):
     """Retrieve user profile, products, wishlist, and ratings."""
     try:
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
-        wishlist_db = load_json(DB_PATH_WISHLIST)
-        products_db = load_json(DB_PATH_PRODUCTS)
-        ratings_db = load_json(DB_PATH_RATINGS)
-
-        account = accounts_db.get(str(user_id))
+        account = ACCOUNTS.get(user_id)
         if not account:
             return jsonify({"error": "User not found"}), 404
 
         # Fetch wishlist products
-        wishlist_products = wishlist_db.get(str(user_id), [])
+        wishlist_products = WISHLIST.get(user_id, [])
 
         wishlist_details = [
-            {"id": product_id, "name": products_db.get(product_id, {}).get("name", "Unknown"), "image": products_db.get(product_id, {}).get("image_url", ""), "tags": products_db.get(product_id, {}).get("tags", [])}
+            {"id": product_id, "name": PRODUCTS.get(product_id, {}).get("name", "Unknown"), "image": PRODUCTS.get(product_id, {}).get("image_url", ""), "tags": PRODUCTS.get(product_id, {}).get("tags", [])}
             for product_id in wishlist_products
         ]
 
         # Fetch products listed by the user
-        user_products = [
-            product for product in products_db.values() if str(product.get("customer_id")) == str(user_id)
-        ]
+        product_ids = sorted(PRODUCTS.find_keys("customer", str(user_id)), key=id_order)
+        products = PRODUCTS.get_many(product_ids)
+        user_products = [products[product_id] for product_id in product_ids if product_id in products]
 
         # Fetch ratings given by the user
-        user_ratings = ratings_db.get(str(user_id), {})
+        user_ratings = RATINGS.get(user_id, {})
 
         # Prepare response
         user_data = {
@@ -1,14 +1,16 @@
 import os
-import json
 from flask import Blueprint, jsonify, request
+from storage import get_collection
+from services import cached_response
+from media import store_upload, release, blob_name, UploadRejectedError
 
 # Blueprint for products
 admin_listings_bp = Blueprint("listings", __name__, url_prefix="/products")
 
-# Paths to the database and upload folder
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_PRODUCTS = os.path.join(DB_FOLDER, "products.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
+PRODUCTS = get_collection("products")
+ACCOUNTS = get_collection("accounts")
+
+# Path to the upload folder
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "../../api/uploads")
 
 # Ensure the upload folder exists
@@ -19,28 +21,16 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def load_json(db_path):
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
-
 @admin_listings_bp.route('/listing/<int:product_id>', methods=['GET'])
+@cached_response("products", "accounts", private=True)
 def get_product(product_id):
     try:
-        products_db = load_json(DB_PATH_PRODUCTS)
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
-
-        product = products_db.get(str(product_id))
+        product = PRODUCTS.get(product_id)
         if not product:
             return jsonify({"error": "Product not found"}), 404
 
         customer_id = str(product.get("customer_id", "Unknown"))
-        customer_username = accounts_db.get(customer_id, {}).get("username", "Unknown")
+        customer_username = ACCOUNTS.get(customer_id, {}).get("username", "Unknown")
 
         response = {
             "id": str(product_id),
@@ -60,12 +50,13 @@ def get_product(product_id):
 @admin_listings_bp.route('/update/<int:product_id>', methods=['POST'])
 def update_product(product_id):
     try:
-        products_db = load_json(DB_PATH_PRODUCTS)
+        product = PRODUCTS.get(product_id)
 
-        if str(product_id) not in products_db:
+        if product is None:
             return jsonify({"error": "Product not found"}), 404
 
-        product = products_db[str(product_id)]
+        product = dict(product)
+        previous_image = product.get("image_url")
         name = request.form.get("name")
         customer_id = request.form.get("customer_id")
         tags = request.form.get("tags")
@@ -80,30 +71,31 @@ def update_product(product_id):
         if "image" in request.files:
             image = request.files["image"]
             if image and allowed_file(image.filename):
-                image_filename = f"product_{product_id}.jpg"
-                image_path = os.path.join(UPLOAD_FOLDER, image_filename)
-                image.save(image_path)
-                product["image_url"] = f"/uploads/{image_filename}"
+                extension = image.filename.rsplit(".", 1)[1]
+                product["image_url"] = "/uploads/" + store_upload(image, f"product:{product_id}", extension)
+
+        PRODUCTS.put(product_id, product)
 
-        products_db[str(product_id)] = product
-        save_json(DB_PATH_PRODUCTS, products_db)
+        if previous_image != product.get("image_url") and blob_name(previous_image):
+            release(f"product:{product_id}", [blob_name(previous_image)])
 
         return jsonify({"message": "Product updated successfully!", "product": product}), 200
 
+    except UploadRejectedError as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @admin_listings_bp.route('/delete/<int:product_id>', methods=['DELETE'])
 def delete_product(product_id):
     try:
-        products_db = load_json(DB_PATH_PRODUCTS)
-
-        if str(product_id) not in products_db:
+        if not PRODUCTS.delete(product_id):
             return jsonify({"error": "Product not found"}), 404
 
-        del products_db[str(product_id)]
-        save_json(DB_PATH_PRODUCTS, products_db)
+        # Drop the product's references to stored images; shared ones stay
+        release(f"product:{product_id}")
 
+        # Images saved before the shared store existed
         image_filename = f"product_{product_id}.jpg"
         image_path = os.path.join(UPLOAD_FOLDER, image_filename)
         if os.path.exists(image_path):
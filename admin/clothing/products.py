@@ -1,33 +1,34 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
+from storage.accounts import usernames
+from storage.products import PRODUCTS, list_products, parse_query
+from storage.ids import next_id
+from services import cached_response
 
 admin_products_bp = Blueprint('products', __name__)
 
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_PRODUCTS = os.path.join(DB_FOLDER, "products.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
 
 @admin_products_bp.route('/products', methods=['GET'])
+@cached_response("products", "accounts", private=True)
 def get_all_products():
+    """
+    List products for the admin panel, sorted by ID unless `sort` is given.
+
+    Takes the same `sort`, `tags`, `any_tags`, `customer_id`, `is_listed`,
+    `limit` and `cursor`/`offset` arguments as the user catalogue. With `limit` the list
+    is wrapped as `{"products": [...], "next_cursor": ...}`.
+    """
     try:
-        products_db = load_json(DB_PATH_PRODUCTS)
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
+        try:
+            query = parse_query(request.args)
+            page, next_cursor = list_products(**query)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         final_products = []
-        for product in products_db.values():
-            customer_data = accounts_db.get(str(product.get("customer_id")))
-            customer_username = customer_data.get("username", "Unknown") if customer_data else "Unknown"
+        products = [product for key, product in page]
+        names = usernames(product.get("customer_id") for product in products)
+        for product in products:
+            customer_username = names.get(str(product.get("customer_id")), "Unknown")
 
             final_products.append({
                 "id": product.get("id"),
@@ -36,7 +37,8 @@ def get_all_products():
                 "image_url": product.get("image_url", ""),
             })
 
-        final_products = sorted(final_products, key=lambda x: x["id"])
+        if "limit" in query:
+            return jsonify({"products": final_products, "next_cursor": next_cursor}), 200
         return jsonify(final_products), 200
 
     except Exception as e:
@@ -52,8 +54,7 @@ def create_product():
         if not name or not customer_id:
             return jsonify({"error": "Name and customer ID are required"}), 400
 
-        products_db = load_json(DB_PATH_PRODUCTS)
-        new_id = max([int(k) for k in products_db.keys()] or [0]) + 1
+        new_id = int(next_id(PRODUCTS))
 
         new_product = {
             "id": new_id,
@@ -63,8 +64,7 @@ def create_product():
             "image_url": "",
         }
 
-        products_db[str(new_id)] = new_product
-        save_json(DB_PATH_PRODUCTS, products_db)
+        PRODUCTS.put(new_id, new_product)
 
         return jsonify({"message": "Product created successfully!", "product": new_product}), 200
 
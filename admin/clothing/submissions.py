@@ -1,34 +1,21 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
+from storage import get_collection
+from storage.accounts import usernames
 
 admin_clothings_bp = Blueprint("clothing", __name__, url_prefix="/clothing")
 
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_SUBMISSIONS = os.path.join(DB_FOLDER, "submissions.json")
-DB_PATH_PRODUCTS = os.path.join(DB_FOLDER, "products.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
+SUBMISSIONS = get_collection("submissions")
+PRODUCTS = get_collection("products")
 
 @admin_clothings_bp.route('/submissions', methods=['GET'])
 def get_submissions():
     try:
-        submissions_db = load_json(DB_PATH_SUBMISSIONS)
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
-
         submissions = []
-        for submission_id, submission in submissions_db.items():
+        all_submissions = SUBMISSIONS.items()
+        names = usernames(submission.get("customerId") for _, submission in all_submissions)
+        for submission_id, submission in all_submissions:
             customer_id = str(submission.get("customerId"))
-            customer_name = accounts_db.get(customer_id, {}).get("username", "Unknown")
+            customer_name = names.get(customer_id, "Unknown")
 
             submissions.append({
                 "id": submission_id,
@@ -1,38 +1,25 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
+from storage import get_collection
+from storage.accounts import usernames
+from storage.ids import next_id
 
 admin_feedbacks_bp = Blueprint('feedback', __name__)
 
-# Define database paths
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_FEEDBACK = os.path.join(DB_FOLDER, "feedback.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
+FEEDBACK = get_collection("feedback")
 
 @admin_feedbacks_bp.route('/feedback', methods=['GET'])
 def get_all_feedbacks():
     try:
-        feedback_db = load_json(DB_PATH_FEEDBACK)
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
-
+        feedbacks = FEEDBACK.items()
+        names = usernames(feedback["user_id"] for _, feedback in feedbacks)
         feedback_list = [
             {
                 "id": feedback_id,
                 "user_id": feedback["user_id"],
-                "username": accounts_db.get(str(feedback["user_id"]), {}).get("username", "Unknown"),
+                "username": names.get(str(feedback["user_id"]), "Unknown"),
                 "feedback": feedback["feedback"],
             }
-            for feedback_id, feedback in feedback_db.items()
+            for feedback_id, feedback in feedbacks
         ]
 
         return jsonify(feedback_list), 200
@@ -49,15 +36,12 @@ def create_feedback():
         if not user_id or not feedback_text:
             return jsonify({"error": "User ID and feedback are required"}), 400
 
-        feedback_db = load_json(DB_PATH_FEEDBACK)
-        new_feedback_id = str(max([int(k) for k in feedback_db.keys()] or [0]) + 1)
+        new_feedback_id = next_id(FEEDBACK)
 
-        feedback_db[new_feedback_id] = {
+        FEEDBACK.put(new_feedback_id, {
             "user_id": user_id,
             "feedback": feedback_text,
-        }
-
-        save_json(DB_PATH_FEEDBACK, feedback_db)
+        })
 
         return jsonify({"message": "Feedback created successfully!", "feedback_id": new_feedback_id}), 201
     except Exception as e:
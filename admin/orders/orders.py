@@ -1,37 +1,41 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
+from storage.accounts import usernames
+from storage.orders import ORDERS, DEFAULT_PAGE_SIZE, create_order as store_order, list_orders
+from storage.products import parse_page
 
 admin_orders_bp = Blueprint("orders", __name__)
 
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_ORDERS = os.path.join(DB_FOLDER, "orders.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
-
 @admin_orders_bp.route('/', methods=['GET'])
 def get_all_orders():
-    try:
-        orders_db = load_json(DB_PATH_ORDERS)
-        accounts_db = load_json(DB_PATH_ACCOUNTS)
+    """
+    List orders with their buyer's username.
 
+    Without arguments every order is returned, sorted by ID. With `limit`
+    (and `cursor`, optionally `user_id`) the response is one page, newest
+    first, wrapped as `{"orders": [...], "next_cursor": ...}`.
+    """
+    try:
+        paginated = any(arg in request.args for arg in ("limit", "cursor", "user_id"))
+        if paginated:
+            try:
+                limit = parse_page(request.args, default_limit=DEFAULT_PAGE_SIZE)["limit"]
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            page, next_cursor = list_orders(request.args.get("user_id"), cursor=request.args.get("cursor"), limit=limit)
+        else:
+            page = ORDERS.items()
+
+        names = usernames(order.get("user_id") for _, order in page)
         orders = [
             {
                 "id": int(order_id),
-                "user": accounts_db.get(str(order.get("user_id")), {}).get("username", "Unknown"),
+                "user": names.get(str(order.get("user_id")), "Unknown"),
             }
-            for order_id, order in orders_db.items()
+            for order_id, order in page
         ]
 
+        if paginated:
+            return jsonify({"orders": orders, "next_cursor": next_cursor}), 200
         return jsonify(sorted(orders, key=lambda x: x["id"])), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -46,18 +50,14 @@ def create_order():
         if not user_id or not shipping_address:
             return jsonify({"error": "User ID and shipping address are required"}), 400
 
-        orders_db = load_json(DB_PATH_ORDERS)
-        new_order_id = str(max([int(k) for k in orders_db.keys()] or [0]) + 1)
-
         new_order = {
             "user_id": user_id,
             "shipping_address": shipping_address,
             "products": data.get("products", []),
         }
 
-        orders_db[new_order_id] = new_order
-        save_json(DB_PATH_ORDERS, orders_db)
+        new_order_id, _ = store_order(new_order)
 
         return jsonify({"message": "Order created successfully!", "order_id": new_order_id}), 201
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
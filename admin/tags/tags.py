@@ -1,34 +1,21 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
+from storage import get_collection
+from storage.ids import next_id
+from services import cached_response
 
 # Blueprint for tags
 admin_tags_bp = Blueprint("tags", __name__)
 
-# Path to the tags JSON database
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../../db")
-DB_PATH_TAGS = os.path.join(DB_FOLDER, "tags.json")
-
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to a file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
+TAGS = get_collection("tags")
 
 @admin_tags_bp.route('/tags', methods=['GET'])
+@cached_response("tags", private=True)
 def get_all_tags():
     """
     Retrieve all tags with their names and descriptions.
     """
     try:
-        tags_db = load_json(DB_PATH_TAGS)
-        tags = list(tags_db.values())  # Convert to a list
+        tags = TAGS.values()
         return jsonify(tags), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -46,19 +33,16 @@ def create_tag():
         if not tag_name or not tag_name.strip():
             return jsonify({"error": "Tag name cannot be empty"}), 400
 
-        tags_db = load_json(DB_PATH_TAGS)
-
         # Check for duplicates
-        if any(tag["name"] == tag_name for tag in tags_db.values()):
+        if any(tag["name"] == tag_name for tag in TAGS.values()):
             return jsonify({"error": "Tag already exists"}), 400
 
         # Generate a unique ID
-        tag_id = str(max([int(k) for k in tags_db.keys()] or [0]) + 1)
+        tag_id = next_id(TAGS)
 
         # Add the new tag
         new_tag = {"id": tag_id, "name": tag_name, "description": description}
-        tags_db[tag_id] = new_tag
-        save_json(DB_PATH_TAGS, tags_db)
+        TAGS.put(tag_id, new_tag)
 
         return jsonify({"message": f"Tag '{tag_name}' created successfully!", "tag": new_tag}), 201
 
@@ -77,13 +61,10 @@ def delete_tag():
         if not tag_name:
             return jsonify({"error": "Tag name is required"}), 400
 
-        tags_db = load_json(DB_PATH_TAGS)
-
         # Find and delete the tag by name
-        for key, value in list(tags_db.items()):
+        for key, value in TAGS.items():
             if value.get("name") == tag_name:
-                del tags_db[key]
-                save_json(DB_PATH_TAGS, tags_db)
+                TAGS.delete(key)
                 return jsonify({"message": f"Tag '{tag_name}' deleted successfully!"}), 200
 
         return jsonify({"error": f"Tag '{tag_name}' not found"}), 404
@@ -105,18 +86,20 @@ def update_tag():
         if not tag_id:
             return jsonify({"error": "Tag ID is required"}), 400
 
-        tags_db = load_json(DB_PATH_TAGS)
+        tag = TAGS.get(tag_id)
 
-        if tag_id not in tags_db:
+        if tag is None:
             return jsonify({"error": "Tag not found"}), 404
 
+        tag = dict(tag)
+
         # Update fields if provided
         if new_name:
-            tags_db[tag_id]["name"] = new_name
+            tag["name"] = new_name
         if new_description:
-            tags_db[tag_id]["description"] = new_description
+            tag["description"] = new_description
 
-        save_json(DB_PATH_TAGS, tags_db)
+        TAGS.put(tag_id, tag)
 
         return jsonify({"message": "Tag updated successfully!"}), 200
 
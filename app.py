@@ -1,11 +1,17 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 import os
 from flask_mail import Mail
+from media import init_uploads
+from services.auth import init_auth
 
 app = Flask(__name__)
+# Stream uploads to disk and cap their size
+init_uploads(app)
 jwt = JWTManager(app)
+# Reject tokens of disabled accounts and revoked tokens
+init_auth(jwt)
 app.config["JWT_SECRET_KEY"] = "the-29th-of-september"  # Change this to a strong secret key
 
 # ✅ Email Configuration
@@ -20,6 +26,8 @@ mail = Mail(app)
 
 from admin import admin_bp
 from user import user_bp
+from media import serve_image
+from services.webhooks import start_worker as start_webhook_worker
 
 # Register Blueprints
 app.register_blueprint(admin_bp)
@@ -27,6 +35,11 @@ app.register_blueprint(user_bp)
 
 CORS(app)
 
+# Apply Stripe events queued before a restart. Not in image worker processes:
+# when started as `python app.py`, spawn re-imports this file as __mp_main__.
+if __name__ != "__mp_main__":
+    start_webhook_worker()
+
 # Define the upload folders
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "api/uploads")
 PRODUCTS_FOLDER = os.path.join(UPLOAD_FOLDER, "products")
@@ -36,9 +49,9 @@ app.config["PRODUCTS_FOLDER"] = PRODUCTS_FOLDER
 # Ensure the directories exist
 os.makedirs(PRODUCTS_FOLDER, exist_ok=True)
 
-# Serve static files
-app.add_url_rule('/uploads/<path:filename>', 'uploads', lambda filename: send_from_directory(UPLOAD_FOLDER, filename))
-app.add_url_rule('/uploads/products/<path:filename>', 'products', lambda filename: send_from_directory(PRODUCTS_FOLDER, filename))
+# Serve static files (`?w=`, `?size=` or `?format=` return a resized variant)
+app.add_url_rule('/uploads/<path:filename>', 'uploads', lambda filename: serve_image(UPLOAD_FOLDER, filename))
+app.add_url_rule('/uploads/products/<path:filename>', 'products', lambda filename: serve_image(PRODUCTS_FOLDER, filename))
 
 # Example route to test the server
 @app.route('/')
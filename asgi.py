@@ -0,0 +1,131 @@
+"""
+ASGI entry point, for serving the app from an async server:
+
+    uvicorn asgi:application --workers 4
+
+The Flask app stays a WSGI app: each of its requests holds a thread from
+start to finish, as it would under a WSGI server, and at most WSGI_THREADS
+run at once.
+Only the chat event stream, which stays open for minutes, is served natively
+on the event loop instead of through Flask, so an open stream costs a
+coroutine rather than a thread and one process can hold thousands of them.
+"""
+import os
+import json
+import asyncio
+from urllib.parse import parse_qs
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+
+from app import app
+from services.auth import blocked_reason
+from user.events import stream_events_async, STREAM_HEADERS
+
+EVENTS_PATH = "/api/user/events"
+
+# Flask requests running at once per process
+WSGI_THREADS = int(os.environ.get("CLOOP_WSGI_THREADS", 32))
+
+_wsgi_slots = asyncio.Semaphore(WSGI_THREADS)
+
+
+class _Wsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        # asgiref runs every request on one shared thread unless each gets its own context
+        async with _wsgi_slots, ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+def _closing(wsgi_app):
+    """Make sure response iterables are closed even when the adapter stops iterating early."""
+    def wrapper(environ, start_response):
+        result = wsgi_app(environ, start_response)
+        try:
+            yield from result
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+    return wrapper
+
+
+flask_application = _Wsgi(_closing(app.wsgi_app))
+
+
+def _token(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value.startswith(b"Bearer "):
+            return value[len(b"Bearer "):].decode("latin-1")
+    # EventSource cannot set headers
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(app.config["JWT_QUERY_STRING_NAME"])
+    return values[0] if values else None
+
+
+def _identity(scope):
+    """Return the user ID of the stream's access token, or None if it has none or it is invalid, revoked or disabled."""
+    token = _token(scope)
+    if not token:
+        return None
+    try:
+        with app.app_context():
+            claims = decode_token(token)
+    except Exception:
+        return None
+    if claims.get("type") != "access" or blocked_reason(claims, app.config["JWT_IDENTITY_CLAIM"]):
+        return None
+    return str(claims[app.config["JWT_IDENTITY_CLAIM"]]["id"])
+
+
+def _headers(headers):
+    # Same CORS policy as CORS(app) in app.py
+    return [(b"access-control-allow-origin", b"*")] + [
+        (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()
+    ]
+
+
+async def events(scope, receive, send):
+    """Serve the chat event stream on the event loop."""
+    user_id = _identity(scope)
+    if user_id is None:
+        await send({"type": "http.response.start", "status": 401,
+                    "headers": _headers({"Content-Type": "application/json"})})
+        await send({"type": "http.response.body", "body": json.dumps({"msg": "Missing or invalid token"}).encode()})
+        return
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": _headers({"Content-Type": "text/event-stream; charset=utf-8", **STREAM_HEADERS})})
+
+    async def pump():
+        async for frame in stream_events_async(user_id):
+            await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body"})
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(pump()), asyncio.create_task(watch_disconnect())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+    elif scope["type"] == "http" and scope["path"] == EVENTS_PATH and scope["method"] == "GET":
+        await events(scope, receive, send)
+    else:
+        await flask_application(scope, receive, send)
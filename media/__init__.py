@@ -0,0 +1,9 @@
+from .images import process_image
+from .uploads import save_incoming, init_uploads, UploadRejectedError
+from .jobs import submit_job, get_job, QueueFullError
+from .variants import get_variant
+from .store import store_upload, store_image, release, blob_name
+from .static import serve_image, send_upload
+
+__all__ = ["save_incoming", "init_uploads", "UploadRejectedError", "process_image", "submit_job", "get_job",
+           "QueueFullError", "serve_image", "send_upload", "get_variant", "store_upload", "store_image", "release", "blob_name"]
@@ -0,0 +1,50 @@
+import os
+from PIL import Image, UnidentifiedImageError
+
+# Largest image we decode; a phone photo is 12-50 megapixels. Pillow refuses
+# to open images over twice this as decompression bombs.
+MAX_IMAGE_PIXELS = 64_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Part of every compressed image's blob name. Bump it whenever process_image
+# would write different bytes for the same upload (quality, resampling,
+# Pillow upgrades that change the encoder), so the new output gets new URLs
+# instead of replacing files that clients cache as immutable.
+PROCESSING_VERSION = 1
+
+
+def process_image(source, destination, max_width, quality=85):
+    """
+    Decode `source`, shrink it to at most `max_width` pixels wide and write it
+    to `destination` as an optimized JPEG. Runs in a worker process.
+
+    The source file is removed afterwards, whether or not it could be decoded.
+    Returns the destination file name.
+    """
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    try:
+        with Image.open(source) as img:
+            if img.width * img.height > MAX_IMAGE_PIXELS:
+                raise ValueError("Uploaded image is too large")
+
+            # JPEGs decode straight at a reduced scale (1/2 to 1/8) when that
+            # is still wider than max_width, instead of at full size
+            if img.width > max_width:
+                img.draft("RGB", (max_width, max(1, max_width * img.height // img.width)))
+
+            img = img.convert("RGB")  # Ensure compatibility
+
+            # Resize if wider than max_width while keeping aspect ratio
+            if img.width > max_width:
+                height = int(max_width * img.height / img.width)
+                img = img.resize((max_width, height), Image.LANCZOS)
+
+            img.save(tmp_path, "JPEG", quality=quality, optimize=True)
+        os.replace(tmp_path, destination)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValueError("Uploaded file is not a readable image")
+    finally:
+        for path in (tmp_path, source):
+            if os.path.exists(path):
+                os.remove(path)
+    return os.path.basename(destination)
@@ -0,0 +1,121 @@
+"""
+Background image jobs.
+
+Image work runs in a bounded process pool so requests only have to save the
+upload and queue it. Each job has a record in the `image_jobs` collection
+("queued", then "done" or "failed") that any worker can serve to clients
+polling for the result. A job whose web worker dies before it finishes
+stays "queued".
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from storage import get_collection
+
+logger = logging.getLogger(__name__)
+
+JOBS = get_collection("image_jobs")
+
+# Worker processes for image work, and how many jobs this web worker may have
+# queued or running before new uploads are turned away
+MAX_WORKERS = int(os.environ.get("CLOOP_IMAGE_WORKERS", min(4, os.cpu_count() or 1)))
+MAX_PENDING_JOBS = 64
+
+# Finished job records are kept this many seconds for polling
+JOB_RETENTION = 24 * 60 * 60
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+
+class QueueFullError(Exception):
+    """Raised when too many image jobs are already waiting."""
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web server can deadlock the children
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _prune():
+    """Delete finished job records older than JOB_RETENTION."""
+    cutoff = time.time() - JOB_RETENTION
+    for job_id, job in JOBS.items():
+        if job.get("status") != "queued" and (job.get("finished") or 0) < cutoff:
+            JOBS.delete(job_id)
+
+
+def _finish(job_id, future, on_done, on_error):
+    global _pending
+    try:
+        result = future.result()
+        if on_done:
+            on_done(result)
+        JOBS.update(job_id, lambda job: {**(job or {}), "status": "done", "result": result, "finished": time.time()})
+    except Exception as e:
+        logger.exception("Image job %s failed", job_id)
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool()
+        if on_error:
+            try:
+                on_error(e)
+            except Exception:
+                logger.exception("Cleanup for image job %s failed", job_id)
+        JOBS.update(job_id, lambda job: {**(job or {}), "status": "failed", "error": str(e), "finished": time.time()})
+    finally:
+        with _pool_lock:
+            _pending -= 1
+
+    try:
+        _prune()
+    except Exception:
+        logger.exception("Could not prune image jobs")
+
+
+def submit_job(func, *args, on_done=None, on_error=None):
+    """
+    Run `func(*args)` in the image pool and return the new job's ID.
+
+    `func` must be importable by the worker processes. `on_done(result)` runs
+    in this process once the job succeeds, and `on_error(exception)` if it
+    or `on_done` fails. Raises QueueFullError if
+    MAX_PENDING_JOBS jobs are already waiting.
+    """
+    global _pending
+    with _pool_lock:
+        if _pending >= MAX_PENDING_JOBS:
+            raise QueueFullError("Image processing queue is full, try again shortly")
+        _pending += 1
+
+    job_id = uuid.uuid4().hex
+    try:
+        JOBS.put(job_id, {"id": job_id, "status": "queued", "result": None, "error": None, "created": time.time()})
+        future = _get_pool().submit(func, *args)
+    except BaseException:
+        with _pool_lock:
+            _pending -= 1
+        raise
+    future.add_done_callback(lambda future: _finish(job_id, future, on_done, on_error))
+    return job_id
+
+
+def get_job(job_id):
+    """Return the job record for `job_id`, or None."""
+    return JOBS.get(job_id)
@@ -0,0 +1,110 @@
+"""
+Static upload serving.
+
+Uploads and their variants are sent with `Last-Modified` and `ETag` so
+clients revalidate with a 304, honour `Range` requests, and go out through
+the WSGI server's file wrapper, which uses sendfile(2) where the server
+supports it (gunicorn, uWSGI). A blob name always means the same content
+(see media.store), so blobs and their variants are cached for a year as
+immutable.
+
+Set `CLOOP_STATIC_OFFLOAD` to hand the transfer to a front proxy instead of
+a Flask worker:
+
+- `x-accel`: nginx. Responds with `X-Accel-Redirect: <CLOOP_X_ACCEL_PREFIX>/<path>`,
+  which must be an `internal` location aliased to `api/uploads/`.
+- `x-sendfile`: Apache mod_xsendfile or lighttpd. Responds with the
+  file's absolute path in `X-Sendfile`.
+"""
+import os
+
+from flask import request, jsonify, current_app, abort
+from PIL import Image
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from .uploads import UPLOAD_FOLDER
+from .store import blob_name
+from .variants import VARIANT_SIZES, VARIANT_FORMATS, variant_width, get_variant
+
+STATIC_OFFLOAD = os.environ.get("CLOOP_STATIC_OFFLOAD")
+X_ACCEL_PREFIX = os.environ.get("CLOOP_X_ACCEL_PREFIX", "/protected/uploads").rstrip("/")
+
+# Cache lifetime for content-addressed URLs
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def send_upload(path, mimetype=None, immutable=False):
+    """
+    Send the file at `path` with conditional and range support, or offload
+    it to the front proxy when CLOOP_STATIC_OFFLOAD is set.
+
+    `immutable` marks content that never changes under this URL.
+    """
+    environ = request.environ
+    relative = os.path.relpath(os.path.abspath(path), UPLOAD_FOLDER)
+    offload = STATIC_OFFLOAD in ("x-accel", "x-sendfile") and not relative.startswith("..")
+    if offload:
+        # The proxy serves byte ranges itself from the whole file
+        environ = {key: value for key, value in environ.items() if key != "HTTP_RANGE"}
+
+    response = send_file(
+        os.path.abspath(path),
+        environ,
+        mimetype=mimetype,
+        use_x_sendfile=offload,
+        response_class=current_app.response_class,
+        max_age=IMMUTABLE_MAX_AGE if immutable else None,
+    )
+    if immutable:
+        response.cache_control.immutable = True
+
+    if STATIC_OFFLOAD == "x-accel" and response.headers.pop("X-Sendfile", None):
+        response.headers["X-Accel-Redirect"] = f"{X_ACCEL_PREFIX}/{relative.replace(os.sep, '/')}"
+    return response
+
+
+def _requested_format():
+    fmt = request.args.get("format")
+    if fmt is not None:
+        fmt = "jpeg" if fmt == "jpg" else fmt
+        if fmt not in VARIANT_FORMATS:
+            raise ValueError(f"'format' must be one of {', '.join(VARIANT_FORMATS)}")
+        return fmt
+    # Only when named explicitly: clients that cannot decode WebP still send */*
+    accepts_webp = any(mimetype == "image/webp" and quality > 0 for mimetype, quality in request.accept_mimetypes)
+    return "webp" if accepts_webp else "jpeg"
+
+
+def serve_image(folder, filename):
+    """
+    Serve `filename` from `folder`, or one of its variants when the request
+    asks for `w`, `size` or `format`.
+    """
+    source = safe_join(folder, filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+    immutable = blob_name(filename) is not None
+
+    if not any(arg in request.args for arg in ("w", "size", "format")):
+        return send_upload(source, immutable=immutable)
+
+    try:
+        width = int(request.args.get("w", VARIANT_SIZES["full"]))
+    except ValueError:
+        return jsonify({"error": "'w' must be an integer"}), 400
+    try:
+        width = variant_width(width, request.args.get("size"))
+        fmt = _requested_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        path = get_variant(source, width, fmt)
+    except (OSError, Image.DecompressionBombError):
+        abort(404)  # Not an image we can render
+
+    response = send_upload(path, mimetype=VARIANT_FORMATS[fmt][2], immutable=immutable)
+    if "format" not in request.args:
+        response.vary.add("Accept")
+    return response
@@ -0,0 +1,211 @@
+"""
+Content-addressed upload store.
+
+Uploads are kept once under `api/uploads/blobs/<2 hex>/<sha256>.<ext>`, so two
+users uploading `IMG_5480.jpg` never overwrite each other and identical
+uploads share one file. Images that are compressed in the background are
+named after the hash of the upload, the width they are shrunk to and
+PROCESSING_VERSION rather than after their own bytes, so their URL is known
+before the job finishes. Either way a blob name always means the same
+content, which makes its URL safe to cache forever.
+
+The `blobs` collection records which owners ("product:3", "account:1", ...)
+reference each blob. A blob's file is removed when its last owner releases
+it. Both steps check and change the file inside the collection's writer
+lock, and the record of a blob nobody references is deleted in the same
+write, so a concurrent upload of the same content cannot lose its file.
+"""
+import os
+import shutil
+import hashlib
+import logging
+import threading
+
+from storage import get_collection, DELETE
+from .images import process_image, PROCESSING_VERSION
+from .uploads import UPLOAD_FOLDER, save_incoming
+from .jobs import submit_job
+from .variants import VARIANTS_FOLDER, content_hash
+
+logger = logging.getLogger(__name__)
+
+BLOBS = get_collection("blobs")
+
+# Images being compressed by this process: blob name -> job ID and the
+# (on done, on failure) callbacks of every upload waiting for it
+_compressing = {}
+_compressing_lock = threading.RLock()
+
+BLOBS_FOLDER = "blobs"
+
+BLOBS.add_index("owner", lambda blob: blob.get("owners"), multi=True)
+
+
+def blob_path(name):
+    """Path of a blob relative to the upload folder, e.g. `blobs/ab/ab12….jpg`."""
+    return f"{BLOBS_FOLDER}/{name[:2]}/{name}"
+
+
+def blob_name(path):
+    """Return the blob name in an upload path or URL (`/uploads/blobs/…`), or None if it is not a blob."""
+    if not path:
+        return None
+    parts = path.lstrip("/").split("/")
+    if parts[0] == "uploads":
+        parts = parts[1:]
+    if len(parts) == 3 and parts[0] == BLOBS_FOLDER and parts[2].startswith(parts[1]):
+        return parts[2]
+    return None
+
+
+def _file(name):
+    return os.path.join(UPLOAD_FOLDER, BLOBS_FOLDER, name[:2], name)
+
+
+def acquire(name, owner):
+    """Record that `owner` references blob `name`. Returns True if the blob's file already exists."""
+    exists = []
+
+    def change(blob):
+        blob = blob or {"path": blob_path(name), "owners": []}
+        if owner not in blob["owners"]:
+            blob["owners"].append(owner)
+        exists.append(os.path.exists(_file(name)))
+        return blob
+
+    BLOBS.update(name, change)
+    return exists[0]
+
+
+def release(owner, names=None):
+    """Drop `owner`'s references (to `names`, or to every blob), deleting blobs nobody references."""
+    for name in list(names) if names is not None else BLOBS.find_keys("owner", owner):
+        if name is None or name not in BLOBS:
+            continue
+
+        def change(blob):
+            if blob is None:
+                return DELETE
+            blob["owners"] = [other for other in blob["owners"] if other != owner]
+            if not blob["owners"]:
+                _remove_file(name)
+                return DELETE
+            return blob
+
+        BLOBS.update(name, change)
+
+
+def _remove_file(name):
+    path = _file(name)
+    if not os.path.exists(path):
+        return
+    variants = os.path.join(os.path.dirname(path), VARIANTS_FOLDER, content_hash(path))
+    shutil.rmtree(variants, ignore_errors=True)
+    os.remove(path)
+
+
+def store_upload(file, owner, extension):
+    """
+    Store an upload as is and return its path relative to the upload folder.
+    Raises UploadRejectedError if it is too large or not a usable image.
+    """
+    incoming, digest = save_incoming(file, UPLOAD_FOLDER)
+    name = f"{digest}.{extension.lower()}"
+    try:
+        if not acquire(name, owner):
+            os.makedirs(os.path.dirname(_file(name)), exist_ok=True)
+            os.replace(incoming, _file(name))
+    finally:
+        if os.path.exists(incoming):
+            os.remove(incoming)
+    return blob_path(name)
+
+
+def store_image(file, owner, max_width, on_done=None, on_error=None):
+    """
+    Store an upload compressed to `max_width` as JPEG in the background.
+
+    Returns `(path relative to the upload folder, job ID)`; the job ID is None
+    when the same image was already stored, in which case `on_done` runs
+    straight away. If the job fails, `owner`'s reference is released and
+    `on_error` is called with the path, which no longer names a file. An image
+    that is already being compressed, e.g. the same photo twice in one
+    submission, joins that job instead of starting another. Raises
+    UploadRejectedError if the upload is too large or not a usable image, and
+    QueueFullError if the image pool is saturated.
+    """
+    incoming, digest = save_incoming(file, UPLOAD_FOLDER)
+    name = image_name(digest, max_width)
+
+    def done():
+        if on_done:
+            on_done(blob_path(name))
+
+    def failed():
+        # The job never produced the file, or on_done could not use it
+        _discard(incoming)
+        release(owner, [name])
+
+    def job_failed():
+        failed()
+        if on_error:
+            on_error(blob_path(name))
+
+    try:
+        if acquire(name, owner):
+            _discard(incoming)
+            done()
+            return blob_path(name), None
+
+        with _compressing_lock:
+            job = _compressing.get(name)
+            if job is not None:
+                _discard(incoming)
+                job["waiters"].append((done, job_failed))
+                return blob_path(name), job["id"]
+
+            job = _compressing[name] = {"id": None, "waiters": [(done, job_failed)]}
+            try:
+                os.makedirs(os.path.dirname(_file(name)), exist_ok=True)
+                job["id"] = submit_job(process_image, incoming, _file(name), max_width,
+                                       on_done=lambda result: _finish_compressing(name, True),
+                                       on_error=lambda error: _finish_compressing(name, False))
+            except BaseException:
+                _compressing.pop(name, None)
+                raise
+    except BaseException:
+        failed()
+        raise
+    return blob_path(name), job["id"]
+
+
+def _finish_compressing(name, succeeded):
+    """Run the callbacks of every upload waiting for blob `name` to be compressed."""
+    with _compressing_lock:
+        job = _compressing.pop(name, None)
+    for done, failed in job["waiters"] if job else ():
+        if succeeded:
+            try:
+                done()
+                continue
+            except Exception:
+                logger.exception("Could not use image %s", name)
+        try:
+            failed()
+        except Exception:
+            logger.exception("Could not clean up after image %s", name)
+
+
+def image_name(digest, max_width):
+    """
+    Blob name of an upload with SHA-256 `digest` compressed to `max_width` by
+    the current PROCESSING_VERSION. It identifies the input and the processing,
+    not a hash of the output.
+    """
+    key = f"{digest}:{max_width}:v{PROCESSING_VERSION}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".jpg"
+
+
+def _discard(path):
+    if os.path.exists(path):
+        os.remove(path)
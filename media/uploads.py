@@ -0,0 +1,199 @@
+"""
+Streaming uploads.
+
+Flask normally spools each uploaded file into a temporary file (or memory)
+that we then copy into the upload folder. `UploadRequest` instead has
+Werkzeug stream every file part straight into `api/uploads/.incoming`, and
+hashes and size-checks the bytes as they arrive. Only the image header is
+read from the stream: the first bytes are kept (at most MAX_HEADER_SIZE) and
+opened with Pillow just far enough to learn the image's size, so an
+oversized file or decompression bomb is rejected before anything is decoded.
+The pixels are decoded later, by the image worker, from the copy in
+`.incoming`. Memory per request stays bounded by MAX_HEADER_SIZE whatever
+the upload size. Incoming files that no handler keeps are removed when the
+request ends.
+"""
+import io
+import os
+import uuid
+import hashlib
+
+from flask import Request, request, jsonify
+from PIL import Image
+
+from .images import MAX_IMAGE_PIXELS
+
+UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), "../api/uploads"))
+
+# Uploads are saved here first and removed once they have been processed
+INCOMING_FOLDER = ".incoming"
+CHUNK_SIZE = 1024 * 1024
+
+# Largest request body, and largest single uploaded file
+MAX_REQUEST_SIZE = 100 * 1024 * 1024
+MAX_FILE_SIZE = 25 * 1024 * 1024
+
+# An image's header must turn up within this many bytes
+MAX_HEADER_SIZE = 1024 * 1024
+
+
+class UploadRejectedError(Exception):
+    """Raised for an upload that is too large or not a usable image; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class IncomingFile:
+    """
+    Writable file in the incoming folder that an upload is streamed into.
+
+    Tracks the sha256 and size of what was written and reads the image size
+    from the header in the first bytes. Problems are recorded rather than
+    raised, so the rest of the request can still be parsed; `keep` raises them.
+    """
+
+    def __init__(self, folder=None, max_size=MAX_FILE_SIZE):
+        folder = folder or os.path.join(UPLOAD_FOLDER, INCOMING_FOLDER)
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, uuid.uuid4().hex)
+        self.max_size = max_size
+        self.size = 0
+        self.error = None
+        self.kept = False
+        self._file = open(self.path, "w+b")
+        self._digest = hashlib.sha256()
+        self._header = bytearray()  # None once the header has been read
+
+    def write(self, data):
+        self.size += len(data)
+        if self.error is not None:
+            return len(data)  # Drain the rest of the part without storing it
+        if self.size > self.max_size:
+            self._reject(f"Each file must be at most {self.max_size // (1024 * 1024)} MB", 413)
+            return len(data)
+
+        self._digest.update(data)
+        self._file.write(data)
+        if self._header is not None:
+            self._header += data[:MAX_HEADER_SIZE - len(self._header)]
+            self._sniff(complete=len(self._header) >= MAX_HEADER_SIZE)
+        return len(data)
+
+    def _sniff(self, complete):
+        """
+        Read the image size from the buffered header. Until `complete`, a header
+        that does not parse yet may just be cut short, so it is tried again later.
+        """
+        too_large = f"Images must be at most {MAX_IMAGE_PIXELS // 1_000_000} megapixels"
+        try:
+            # Image.open only parses the header; nothing is decoded or allocated for pixels
+            with Image.open(io.BytesIO(bytes(self._header))) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self._reject(too_large)
+            return
+        except Exception:
+            if complete:
+                self._reject("Uploaded file is not a readable image")
+            return
+        self._header = None  # The header is all we need; the worker decodes the rest
+        if width * height > MAX_IMAGE_PIXELS:
+            self._reject(too_large)
+
+    def _reject(self, message, status=400):
+        self.error = UploadRejectedError(message, status)
+        self._header = None
+        self._file.truncate(0)
+
+    # Werkzeug rewinds the stream once the part is complete, and FileStorage reads from it
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def close(self):
+        self._file.close()
+
+    def keep(self):
+        """
+        Take ownership of the file. Returns `(path, sha256 hex digest)`; the
+        caller must move or remove the file. Raises UploadRejectedError.
+        """
+        if self.error is None and self._header is not None:
+            # The whole file is in the header buffer and has not parsed yet
+            self._sniff(complete=True)
+        if self.error is not None:
+            self.discard()
+            raise self.error
+        self._file.close()
+        self.kept = True
+        return self.path, self._digest.hexdigest()
+
+    def discard(self):
+        """Remove the file unless it has been kept."""
+        self._file.close()
+        if not self.kept and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadRequest(Request):
+    """Request class that streams uploaded files into the incoming folder."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        incoming = IncomingFile()
+        self.__dict__.setdefault("incoming_files", []).append(incoming)
+        return incoming
+
+
+def save_incoming(file, folder=UPLOAD_FOLDER):
+    """
+    Save an uploaded file under `folder`/.incoming with a unique name.
+
+    Files streamed by `UploadRequest` are already there and are only handed
+    over. Returns `(path, sha256 hex digest of the contents)`. Raises
+    UploadRejectedError for a file over MAX_FILE_SIZE or an image that is
+    unreadable or over MAX_IMAGE_PIXELS.
+    """
+    stream = file.stream
+    if not isinstance(stream, IncomingFile):
+        incoming = IncomingFile(os.path.join(folder, INCOMING_FOLDER))
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                incoming.write(chunk)
+        except BaseException:
+            incoming.discard()
+            raise
+        stream = incoming
+    return stream.keep()
+
+
+def _check_content_length():
+    if request.content_length is not None and request.content_length > MAX_REQUEST_SIZE:
+        return _too_large()
+
+
+def _too_large(error=None):
+    return jsonify({"error": f"Uploads must total at most {MAX_REQUEST_SIZE // (1024 * 1024)} MB"}), 413
+
+
+def _discard_incoming(error=None):
+    for incoming in request.__dict__.get("incoming_files", ()):
+        try:
+            incoming.discard()
+        except OSError as e:
+            print(f"⚠️ Could not remove incoming upload {incoming.path}: {e}")
+
+
+def init_uploads(app):
+    """Stream uploads for `app`, cap request bodies at MAX_REQUEST_SIZE and clean up unused uploads."""
+    app.request_class = UploadRequest
+    app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_SIZE
+    app.before_request(_check_content_length)
+    app.register_error_handler(413, _too_large)
+    app.teardown_request(_discard_incoming)
@@ -0,0 +1,109 @@
+"""
+Responsive image variants.
+
+An uploaded image can be requested at a smaller width (`?w=<pixels>` or
+`?size=thumb|medium|full`) and as WebP or JPEG (`?format=`, otherwise WebP
+when the client's Accept header allows it). Variants are generated on first
+request and cached on disk as `.variants/<hash>/<width>.<ext>` next to the
+source, keyed by the source's content hash, so replacing an upload never
+serves a stale variant and identical uploads share their variants.
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+VARIANTS_FOLDER = ".variants"
+
+# Widths we render; requested widths are rounded up to one of these
+VARIANT_SIZES = {
+    "thumb": 240,
+    "medium": 540,
+    "full": 1080,
+}
+
+# format -> (PIL format, file extension, mimetype, save options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+# Source files whose hash is remembered, least recently used dropped first
+MAX_CACHED_HASHES = 4096
+
+# source path -> (mtime_ns, size, sha256 hex)
+_hashes = OrderedDict()
+_hashes_lock = threading.Lock()
+_render_locks = {}
+
+
+def content_hash(path):
+    """Return the sha256 of a file, recomputed only when its mtime or size changes."""
+    stat = os.stat(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            _hashes.move_to_end(path)
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with _hashes_lock:
+        _hashes[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        _hashes.move_to_end(path)
+        while len(_hashes) > MAX_CACHED_HASHES:
+            _hashes.popitem(last=False)
+    return digest.hexdigest()
+
+
+def variant_width(width=None, size=None):
+    """Round a requested width (or named size) up to the nearest rendered width."""
+    if size is not None:
+        if size not in VARIANT_SIZES:
+            raise ValueError(f"'size' must be one of {', '.join(VARIANT_SIZES)}")
+        return VARIANT_SIZES[size]
+    widths = sorted(VARIANT_SIZES.values())
+    return next((w for w in widths if w >= width), widths[-1])
+
+
+def _render(source, destination, width, fmt):
+    pil_format, _, _, options = VARIANT_FORMATS[fmt]
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with Image.open(source) as img:
+            has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+            if img.width > width:
+                img.draft("RGB", (width, max(1, width * img.height // img.width)))
+            img = img.convert("RGBA" if has_alpha and fmt == "webp" else "RGB")
+            if img.width > width:
+                img = img.resize((width, int(width * img.height / img.width)), Image.LANCZOS)
+            img.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_variant(source, width, fmt):
+    """Return the path of `source` rendered at `width` in `fmt`, creating it if needed."""
+    digest = content_hash(source)
+    folder = os.path.join(os.path.dirname(source), VARIANTS_FOLDER, digest)
+    path = os.path.join(folder, f"{width}.{VARIANT_FORMATS[fmt][1]}")
+    if os.path.exists(path):
+        return path
+
+    # One render per variant at a time in this process; across processes the
+    # atomic rename makes a duplicate render harmless
+    with _hashes_lock:
+        lock = _render_locks.setdefault(path, threading.Lock())
+    with lock:
+        if not os.path.exists(path):
+            os.makedirs(folder, exist_ok=True)
+            _render(source, path, width, fmt)
+    with _hashes_lock:
+        _render_locks.pop(path, None)
+    return path
@@ -0,0 +1,4 @@
+from .http_cache import cached_response
+from .pubsub import publish, subscribe, get_broker, set_broker, LocalBroker, CollectionBroker
+
+__all__ = ["cached_response", "publish", "subscribe", "get_broker", "set_broker", "LocalBroker", "CollectionBroker"]
@@ -0,0 +1,54 @@
+"""
+Access token checks beyond the signature.
+
+Every `@jwt_required` request is checked against the account behind the
+token and the revocation list, so disabling an account or logging out takes
+effect on the next request instead of when the token expires. Both lookups
+are served from the collections' in-memory copies, which pick up status
+changes from any process incrementally, so the check costs a couple of
+dictionary lookups rather than a read of accounts.json.
+"""
+from flask import jsonify, current_app
+
+from storage.accounts import ACCOUNTS, is_disabled
+from storage.tokens import is_revoked, revoke_token
+
+
+def blocked_reason(claims, identity_claim="sub"):
+    """Return why a decoded token may not be used ("revoked", "disabled" or "deleted"), or None if it may."""
+    if is_revoked(claims.get("jti")):
+        return "revoked"
+    identity = claims.get(identity_claim)
+    user_id = identity.get("id") if isinstance(identity, dict) else None
+    if user_id is None:
+        return None
+    account = ACCOUNTS.get(user_id)
+    if account is None:
+        return "deleted"
+    if is_disabled(account):
+        return "disabled"
+    return None
+
+
+def revoke(claims):
+    """Revoke the token with these decoded claims, e.g. on logout."""
+    revoke_token(claims["jti"], claims.get("exp"))
+
+
+_MESSAGES = {
+    "revoked": "Token has been revoked",
+    "disabled": "Account is disabled",
+    "deleted": "Account no longer exists",
+}
+
+
+def init_auth(jwt):
+    """Register the blocklist check and its error response on a JWTManager."""
+    @jwt.token_in_blocklist_loader
+    def token_blocked(jwt_header, jwt_payload):
+        return blocked_reason(jwt_payload, current_app.config["JWT_IDENTITY_CLAIM"]) is not None
+
+    @jwt.revoked_token_loader
+    def blocked_response(jwt_header, jwt_payload):
+        reason = blocked_reason(jwt_payload, current_app.config["JWT_IDENTITY_CLAIM"]) or "revoked"
+        return jsonify({"error": _MESSAGES[reason]}), 403 if reason == "disabled" else 401
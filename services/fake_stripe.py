@@ -0,0 +1,199 @@
+"""
+Local stand-in for the Stripe API, for development and load tests.
+
+    python -m services.fake_stripe --port 12111 --latency 0.05 --fail-rate 0.1 \
+        --webhook-url http://127.0.0.1:5000/api/user/checkout/webhook --webhook-secret whsec_test
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_WEBHOOK_SECRET=whsec_test flask run
+
+It implements creating and fetching Checkout sessions with Stripe's
+idempotency semantics: replaying a key returns the first response, and
+reusing it with different parameters is an error. `--fail-rate` answers
+that share of requests with a retryable 500, to exercise client retries.
+
+`POST /v1/checkout/sessions/<id>/complete` (not part of Stripe's API) plays
+the customer paying: it marks the session paid and sends a signed
+`checkout.session.completed` event to `--webhook-url`. Every request needs
+an `Authorization: Bearer sk_...` header, as with Stripe.
+"""
+import hmac
+import hashlib
+import urllib.request
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qsl
+
+SESSIONS_PATH = "/v1/checkout/sessions"
+
+
+class FakeStripe:
+    """State of the fake API: sessions by ID and responses by idempotency key."""
+
+    def __init__(self, latency=0.0, fail_rate=0.0, webhook_url=None, webhook_secret=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.sessions = {}
+        self.idempotent = {}
+        self.lock = threading.Lock()
+
+    def create_session(self, params):
+        line_items = {}
+        for name, value in params.items():
+            if name.startswith("line_items["):
+                index, field = name[len("line_items["):].split("]", 1)
+                line_items.setdefault(int(index), {})[field] = value
+        amount = sum(
+            int(item.get("[price_data][unit_amount]", 0)) * int(item.get("[quantity]", 1))
+            for item in line_items.values()
+        )
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+            "mode": params.get("mode"),
+            "status": "open",
+            "payment_status": "unpaid",
+            "amount_total": amount,
+            "currency": params.get("line_items[0][price_data][currency]"),
+            "success_url": params.get("success_url"),
+            "cancel_url": params.get("cancel_url"),
+            "metadata": {name[len("metadata["):-1]: value for name, value in params.items() if name.startswith("metadata[")},
+            "created": int(time.time()),
+        }
+        with self.lock:
+            self.sessions[session_id] = session
+        return session
+
+    def complete_session(self, session_id):
+        """Mark a session paid and send its completion event; returns the session or None."""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.update(status="complete", payment_status="paid")
+        event = {
+            "id": f"evt_{uuid.uuid4().hex}",
+            "object": "event",
+            "type": "checkout.session.completed",
+            "created": int(time.time()),
+            "data": {"object": dict(session)},
+        }
+        if self.webhook_url:
+            threading.Thread(target=self.send_event, args=(event,), daemon=True).start()
+        return session
+
+    def send_event(self, event):
+        """POST an event to the webhook URL, signed like Stripe does."""
+        payload = json.dumps(event).encode("utf-8")
+        timestamp = int(time.time())
+        signature = hmac.new((self.webhook_secret or "").encode("utf-8"), f"{timestamp}.".encode("utf-8") + payload,
+                             hashlib.sha256).hexdigest()
+        request = urllib.request.Request(self.webhook_url, data=payload, method="POST", headers={
+            "Content-Type": "application/json",
+            "Stripe-Signature": f"t={timestamp},v1={signature}",
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                print(f"✅ Sent {event['type']} {event['id']}: {response.status}")
+        except Exception as e:
+            print(f"❌ Could not send {event['type']} {event['id']}: {e}")
+
+
+def _error(status, message, error_type="invalid_request_error"):
+    return status, {"error": {"type": error_type, "message": message}}
+
+
+def make_handler(stripe):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+        def _respond(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Request-Id", f"req_{uuid.uuid4().hex[:14]}")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _prelude(self):
+            """Apply latency, authentication and injected failures; returns a response to send instead, or None."""
+            if stripe.latency:
+                time.sleep(stripe.latency)
+            if not self.headers.get("Authorization", "").startswith("Bearer sk_"):
+                return _error(401, "Invalid API Key provided")
+            if random.random() < stripe.fail_rate:
+                return 500, {"error": {"type": "api_error", "message": "Injected failure"}}
+            return None
+
+        def do_GET(self):
+            response = self._prelude()
+            if response is None:
+                session = stripe.sessions.get(self.path[len(SESSIONS_PATH) + 1:]) if self.path.startswith(SESSIONS_PATH + "/") else None
+                response = (200, session) if session else _error(404, f"No such checkout session: '{self.path}'")
+            self._respond(*response)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            params = dict(parse_qsl(self.rfile.read(length).decode("utf-8"), keep_blank_values=True))
+            response = self._prelude()
+            if response is not None:
+                return self._respond(*response, headers={"Stripe-Should-Retry": "true"} if response[0] == 500 else None)
+            if self.path.startswith(SESSIONS_PATH + "/") and self.path.endswith("/complete"):
+                session = stripe.complete_session(self.path[len(SESSIONS_PATH) + 1:-len("/complete")])
+                return self._respond(*((200, session) if session else _error(404, "No such checkout session")))
+            if self.path != SESSIONS_PATH:
+                return self._respond(*_error(404, f"Unrecognized request URL (POST: {self.path})"))
+
+            key = self.headers.get("Idempotency-Key")
+            with stripe.lock:
+                replay = stripe.idempotent.get(key) if key else None
+            if replay is not None:
+                if replay[0] != params:
+                    return self._respond(*_error(400, "Keys for idempotent requests can only be used with the same parameters",
+                                                 "idempotency_error"))
+                return self._respond(200, replay[1], headers={"Idempotent-Replayed": "true"})
+
+            session = stripe.create_session(params)
+            if key:
+                with stripe.lock:
+                    stripe.idempotent[key] = (params, session)
+            self._respond(200, session)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=12111, latency=0.0, fail_rate=0.0, webhook_url=None, webhook_secret=None):
+    """Run the fake API until interrupted."""
+    server = ThreadingHTTPServer((host, port), make_handler(FakeStripe(latency, fail_rate, webhook_url, webhook_secret)))
+    print(f"✅ Fake Stripe listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake of the Stripe Checkout API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a retryable 500")
+    parser.add_argument("--webhook-url", help="where to send events, e.g. http://127.0.0.1:5000/api/user/checkout/webhook")
+    parser.add_argument("--webhook-secret", help="signing secret, the app's STRIPE_WEBHOOK_SECRET")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency, args.fail_rate, args.webhook_url, args.webhook_secret)
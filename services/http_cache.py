@@ -0,0 +1,81 @@
+"""
+HTTP caching for read-mostly endpoints.
+
+A cached view declares the collections its response is built from. Its
+strong ETag is a hash of the request path and query plus those collections'
+version counters, so any write to them, from any worker, changes the ETag.
+Clients that send a matching `If-None-Match` get a bodiless 304, and
+unchanged responses are replayed from an in-process cache instead of
+rebuilding and re-serializing the JSON.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+
+from storage import get_collection
+
+MAX_CACHED_RESPONSES = 256
+
+# path -> (versions, body, status, mimetype), least recently used first
+_responses = OrderedDict()
+_responses_lock = threading.Lock()
+
+
+def _etag(path, versions):
+    digest = hashlib.sha1(repr((path, versions)).encode("utf-8")).hexdigest()
+    return digest[:32]
+
+
+def _cache_control(max_age, private):
+    scope = "private" if private else "public"
+    if max_age:
+        return f"{scope}, max-age={max_age}"
+    # Always revalidate; with the ETag that is a cheap 304
+    return f"{scope}, no-cache"
+
+
+def cached_response(*collections, max_age=0, private=False):
+    """
+    Cache a GET view's successful responses until one of `collections` changes.
+
+    Adds `ETag` and `Cache-Control` headers (`max_age` seconds of freshness,
+    or revalidate every time by default) and answers `If-None-Match` with 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            path = request.full_path
+            versions = tuple(get_collection(name).version for name in collections)
+            etag = _etag(path, versions)
+            cache_control = _cache_control(max_age, private)
+
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                with _responses_lock:
+                    cached = _responses.get(path)
+                    if cached and cached[0] == versions:
+                        _responses.move_to_end(path)
+                if cached and cached[0] == versions:
+                    response = make_response(cached[1], cached[2])
+                    response.mimetype = cached[3]
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    with _responses_lock:
+                        _responses[path] = (versions, response.get_data(), response.status_code, response.mimetype)
+                        _responses.move_to_end(path)
+                        while len(_responses) > MAX_CACHED_RESPONSES:
+                            _responses.popitem(last=False)
+
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,176 @@
+"""
+Password hashing.
+
+bcrypt is slow on purpose, so hashing runs on a small dedicated thread pool
+(bcrypt releases the GIL while it works). The pool is admission control: at
+most HASH_THREADS hashes run at once per process, so a burst of logins
+cannot take every CPU from the other endpoints, and once MAX_PENDING_HASHES
+are queued or running further logins are turned away with PasswordBusyError
+rather than piling up. `hash_password` and `check_password` still block the
+calling request thread until the hash is done; async callers await
+`hash_password_async` and `check_password_async` instead, which leave the
+event loop free meanwhile.
+
+The cost is set with CLOOP_BCRYPT_ROUNDS. Hashes made with a different cost
+are upgraded in the background the next time their owner logs in. To see
+what a cost means on this machine, run:
+
+    python -m services.passwords --rounds 10 11 12 13
+"""
+import os
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from storage import DELETE
+from storage.accounts import ACCOUNTS
+
+BCRYPT_ROUNDS = int(os.environ.get("CLOOP_BCRYPT_ROUNDS", 12))
+
+# Hashes computed at once, and how many may be queued or running before new ones are refused
+HASH_THREADS = int(os.environ.get("CLOOP_HASH_THREADS", min(4, os.cpu_count() or 1)))
+MAX_PENDING_HASHES = HASH_THREADS * 8
+
+_executor = ThreadPoolExecutor(max_workers=HASH_THREADS, thread_name_prefix="bcrypt")
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+class PasswordBusyError(Exception):
+    """Raised when too many password hashes are already waiting."""
+
+
+def _submit(func, *args):
+    """Run `func(*args)` on the hashing pool and return its future, or raise PasswordBusyError."""
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_PENDING_HASHES:
+            raise PasswordBusyError("Too many sign-ins in progress, please try again shortly")
+        _pending += 1
+
+    def done(future):
+        global _pending
+        with _pending_lock:
+            _pending -= 1
+
+    future = _executor.submit(func, *args)
+    future.add_done_callback(done)
+    return future
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(hashed, password):
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        return False  # Not a bcrypt hash
+
+
+def hash_password(password, rounds=None):
+    """Return the bcrypt hash of `password` as a string, at BCRYPT_ROUNDS unless `rounds` is given."""
+    return _submit(_hash, password, rounds or BCRYPT_ROUNDS).result()
+
+
+def check_password(hashed, password):
+    """Whether `password` matches the stored bcrypt hash `hashed`."""
+    if not hashed:
+        return False
+    return _submit(_check, hashed, password).result()
+
+
+async def hash_password_async(password, rounds=None):
+    """Like `hash_password`, without blocking the event loop while the hash is computed."""
+    return await asyncio.wrap_future(_submit(_hash, password, rounds or BCRYPT_ROUNDS))
+
+
+async def check_password_async(hashed, password):
+    """Like `check_password`, without blocking the event loop while the hash is computed."""
+    if not hashed:
+        return False
+    return await asyncio.wrap_future(_submit(_check, hashed, password))
+
+
+def needs_rehash(hashed):
+    """Whether `hashed` was made with a cost other than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+
+def rehash_later(account_id, hashed, password):
+    """
+    Upgrade an account's hash to BCRYPT_ROUNDS in the background.
+
+    Call after `password` was checked against `hashed`. The new hash is
+    stored only if the account still exists and still has `hashed`, so an
+    account deleted or a password changed meanwhile is left alone; when the
+    pool is busy the upgrade waits for the next login.
+    """
+    def still_current(account):
+        return account is not None and account.get("password") == hashed
+
+    def store(future):
+        new_hash = future.result()
+        if not still_current(ACCOUNTS.get(account_id)):
+            return
+
+        def change(account):
+            if account is None:
+                return DELETE  # Deleted since the check above; stays deleted
+            return {**account, "password": new_hash} if still_current(account) else account
+
+        ACCOUNTS.update(account_id, change)
+
+    def finished(future):
+        try:
+            store(future)
+        except Exception as e:
+            print(f"⚠️ Could not upgrade password hash for account {account_id}: {e}")
+
+    try:
+        _submit(_hash, password, BCRYPT_ROUNDS).add_done_callback(finished)
+    except PasswordBusyError:
+        pass
+
+
+def verify_login(account_id, account, password):
+    """Check `password` for a login, scheduling a hash upgrade when it matches an outdated hash."""
+    hashed = account.get("password") if account else None
+    if not check_password(hashed, password):
+        return False
+    if needs_rehash(hashed):
+        rehash_later(account_id, hashed, password)
+    return True
+
+
+def benchmark(rounds_list, seconds=2.0, threads=HASH_THREADS):
+    """Print hashes per second at each cost, on one thread and on `threads` threads."""
+    for rounds in rounds_list:
+        results = []
+        for workers in sorted({1, threads}):
+            count = 0
+            deadline = time.perf_counter() + seconds
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while time.perf_counter() < deadline:
+                    list(pool.map(lambda _: _hash("correct horse battery staple", rounds), range(workers)))
+                    count += workers
+            results.append(f"{count / (time.perf_counter() - start):8.1f}/s on {workers} thread{'s' if workers > 1 else ''}")
+        print(f"rounds={rounds:2d}  " + "  ".join(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure bcrypt hashes per second for each cost.")
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each measurement")
+    parser.add_argument("--threads", type=int, default=HASH_THREADS)
+    args = parser.parse_args()
+    benchmark(args.rounds, args.seconds, args.threads)
@@ -0,0 +1,146 @@
+"""
+Stripe checkout.
+
+Line items are priced from the products collection in one batch; prices the
+client sends are ignored. Stripe calls go through one StripeClient whose
+keep-alive `requests` session is shared by every request thread, so
+checkouts reuse warm TLS connections. Requests have
+bounded connect/read timeouts and are retried with Stripe's exponential
+backoff under an idempotency key, so a retry never creates a second session.
+
+Paid sessions become orders through the webhook in `services.webhooks`.
+Set STRIPE_API_BASE to point the client at `python -m services.fake_stripe`.
+"""
+import os
+import json
+import uuid
+import hashlib
+import threading
+
+import stripe
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from storage.products import PRODUCTS, price_cents, purchasable
+
+STRIPE_API_KEY = os.environ.get(
+    "STRIPE_API_KEY",
+    "sk_test_51QtAEpFQvhgt2WZEVLCpAg6NNsTqKY4zesjYyEhFhvJ5ZE43E95X41Z3TgtroIc7IT5xyfxjkM14QkMxjtXcn7TE00E8O4aTv8",
+)
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE")
+
+# Seconds to connect, and to wait for a response, per attempt
+STRIPE_CONNECT_TIMEOUT = 3
+STRIPE_READ_TIMEOUT = 10
+STRIPE_MAX_RETRIES = 2
+
+# Pooled keep-alive connections to Stripe per process
+STRIPE_POOL_SIZE = 8
+
+# Stripe's limit on a metadata value
+MAX_METADATA_LENGTH = 500
+
+CURRENCY = "usd"
+SUCCESS_URL = "http://localhost:3000/success"
+CANCEL_URL = "http://localhost:3000/cart"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class CheckoutError(ValueError):
+    """Raised for a cart that cannot be checked out."""
+
+
+def get_client():
+    """Return the process-wide StripeClient with its pooled HTTP session."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            session = Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=STRIPE_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            http_client = stripe.RequestsClient(timeout=(STRIPE_CONNECT_TIMEOUT, STRIPE_READ_TIMEOUT), session=session)
+            _client = stripe.StripeClient(
+                STRIPE_API_KEY,
+                http_client=http_client,
+                max_network_retries=STRIPE_MAX_RETRIES,
+                base_addresses={"api": STRIPE_API_BASE} if STRIPE_API_BASE else {},
+            )
+        return _client
+
+
+def _cart_quantities(items):
+    """Parse `[{"id": 3, "quantity": 1}, ...]` (or bare IDs) into `{product_id: quantity}`."""
+    quantities = {}
+    for item in items:
+        product_id = item.get("id") if isinstance(item, dict) else item
+        quantity = item.get("quantity", 1) if isinstance(item, dict) else 1
+        if product_id is None or not isinstance(quantity, int) or quantity < 1:
+            raise CheckoutError("Each item needs a product 'id' and a positive integer 'quantity'")
+        quantities[str(product_id)] = quantities.get(str(product_id), 0) + quantity
+    if not quantities:
+        raise CheckoutError("No products in cart")
+    return quantities
+
+
+def line_items(quantities):
+    """Build Stripe line items for `{product_id: quantity}`, priced from the products collection."""
+    products = PRODUCTS.get_many(quantities)
+
+    result = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None or not purchasable(product):
+            raise CheckoutError(f"Product {product_id} is not available")
+        unit_amount = price_cents(product)
+        result.append({
+            "price_data": {
+                "currency": CURRENCY,
+                "product_data": {"name": product["name"], "metadata": {"product_id": product_id}},
+                "unit_amount": unit_amount,
+            },
+            "quantity": quantity,
+        })
+    return result
+
+
+def idempotency_key(client_key, params):
+    """
+    Key for one checkout attempt: the client's key (or a fresh one) combined
+    with the cart, so resubmitting a cart reuses its session while a changed
+    cart under the same client key gets a new one.
+    """
+    digest = hashlib.sha256(repr((client_key or uuid.uuid4().hex, params)).encode("utf-8")).hexdigest()
+    return f"checkout-{digest[:48]}"
+
+
+def create_checkout_session(items, client_key=None, user_id=None):
+    """
+    Create a Stripe Checkout session for `items` and return it.
+
+    `client_key` is the client's Idempotency-Key, if it sent one, and
+    `user_id` the buyer the resulting order belongs to. Raises
+    CheckoutError for an invalid cart and stripe.StripeError when Stripe
+    fails after retries.
+    """
+    quantities = _cart_quantities(items)
+    # The webhook turns the paid session into an order from this metadata
+    metadata = {"items": json.dumps(quantities, separators=(",", ":"))}
+    if len(metadata["items"]) > MAX_METADATA_LENGTH:
+        raise CheckoutError("Too many different products for one checkout")
+    if user_id is not None:
+        metadata["user_id"] = str(user_id)
+
+    params = {
+        "payment_method_types": ["card"],
+        "line_items": line_items(quantities),
+        "mode": "payment",
+        "success_url": SUCCESS_URL,
+        "cancel_url": CANCEL_URL,
+        "metadata": metadata,
+    }
+    options = {"idempotency_key": idempotency_key(client_key, params)}
+
+    return get_client().checkout.sessions.create(params=params, options=options)
@@ -0,0 +1,219 @@
+"""
+Publish/subscribe for realtime events.
+
+Views publish small JSON-able events to named channels (`user:<id>`) and
+streaming responses subscribe to them. The broker is pluggable:
+
+- `LocalBroker` fans events out to subscribers in this process. It is
+  enough for a single web worker.
+- `CollectionBroker` also records each event in the `events` collection.
+  One thread per process watches the collection's version and delivers
+  events published by other workers, so it works with several processes on
+  either storage backend without extra services.
+
+`CLOOP_PUBSUB=collection` selects the second one. Anything with the same
+`publish`/`subscribe`/`unsubscribe` methods (e.g. one backed by Redis) can be installed
+with `set_broker`.
+"""
+import os
+import time
+import uuid
+import queue
+import asyncio
+import threading
+
+from storage import get_collection
+
+PUBSUB_BACKEND = os.environ.get("CLOOP_PUBSUB", "local")
+
+# Events a slow subscriber may have waiting before it is told to resync
+MAX_QUEUED_EVENTS = 100
+
+# CollectionBroker: how often to look for other workers' events, and how
+# long events are kept for them
+POLL_INTERVAL = 0.25
+EVENT_RETENTION = 60
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """
+    Events for one subscriber, in publish order.
+
+    `overflowed` is set once MAX_QUEUED_EVENTS were waiting; later events are
+    dropped and the subscriber should reload what it shows.
+    """
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=MAX_QUEUED_EVENTS)
+
+    def deliver(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Return the next event, or None if none arrived within `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read from an asyncio event loop; events may be published from any thread."""
+
+    def __init__(self, broker, channels, loop):
+        super().__init__(broker, channels)
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # The loop has shut down
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Return the next event, or None if none arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Fans events out to the subscribers in this process."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, *channels, loop=None):
+        subscription = AsyncSubscription(self, channels, loop) if loop else Subscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+class CollectionBroker(LocalBroker):
+    """Delivers events across processes through the `events` collection."""
+
+    def __init__(self):
+        super().__init__()
+        self.events = get_collection("events")
+        self._version = self.events.version
+        # key -> publish time of every event already delivered here
+        self._seen = {key: record["published"] for key, record in self.events.items()}
+        self._thread = None
+
+    def subscribe(self, *channels, loop=None):
+        self._start()
+        return super().subscribe(*channels, loop=loop)
+
+    def publish(self, channel, event):
+        key = uuid.uuid4().hex
+        published = time.time()
+        with self._lock:
+            self._seen[key] = published
+        self.events.put(key, {"channel": channel, "event": event, "published": published})
+        self._deliver(channel, event)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll_loop, name="pubsub-poll", daemon=True)
+                self._thread.start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            try:
+                version = self.events.version
+                if version != self._version:
+                    self._version = version
+                    self._poll()
+            except Exception as e:
+                print(f"⚠️ Could not read published events: {e}")
+
+    def _poll(self):
+        cutoff = time.time() - EVENT_RETENTION
+        records = sorted(self.events.items(), key=lambda item: item[1]["published"])
+        with self._lock:
+            new = [record for key, record in records if key not in self._seen and record["published"] >= cutoff]
+            self._seen.update((key, record["published"]) for key, record in records)
+            self._seen = {key: published for key, published in self._seen.items() if published >= cutoff}
+        for record in new:
+            self._deliver(record["channel"], record["event"])
+        for key, record in records:
+            if record["published"] < cutoff:
+                self.events.delete(key)
+
+
+def get_broker():
+    """Return the process-wide broker, creating the one CLOOP_PUBSUB selects."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = CollectionBroker() if PUBSUB_BACKEND == "collection" else LocalBroker()
+        return _broker
+
+
+def set_broker(broker):
+    """Install another broker, e.g. one backed by a message service."""
+    global _broker
+    with _broker_lock:
+        _broker = broker
+
+
+def publish(channel, event):
+    """Publish `event` (a JSON-able dict) to everyone subscribed to `channel`."""
+    get_broker().publish(channel, event)
+
+
+def subscribe(*channels, loop=None):
+    """
+    Return a Subscription to `channels`; close it when done. With an asyncio
+    `loop`, return an AsyncSubscription to await from that loop instead.
+    """
+    return get_broker().subscribe(*channels, loop=loop)
@@ -0,0 +1,203 @@
+"""
+Stripe webhook ingestion.
+
+The webhook view only checks the signature and records the event in the
+`webhook_events` collection under Stripe's event ID, so a redelivered event
+is stored once and Stripe gets its answer straight away. A worker thread in
+each process claims pending events with a lease, applies them and marks them
+done. Events held by a worker that died are picked up again when the lease
+runs out, and failed events are retried with backoff up to MAX_ATTEMPTS.
+
+Paid Checkout sessions become orders; `create_order` is keyed by the session,
+so applying an event twice is harmless.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+
+import stripe
+
+from storage import get_collection, DELETE
+from storage.orders import create_order
+from storage.products import get_products
+from .pubsub import publish
+
+logger = logging.getLogger(__name__)
+
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+
+EVENTS = get_collection("webhook_events")
+EVENTS.add_index("status", lambda record: record.get("status"))
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 5  # Seconds before the first retry, doubled after each failure
+LEASE = 60  # Seconds a worker may hold an event before others may take it over
+POLL_INTERVAL = 2
+EVENT_RETENTION = 7 * 24 * 60 * 60  # Longer than Stripe keeps redelivering
+
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_handlers = {}
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+class WebhookError(ValueError):
+    """Raised for a webhook request that is not a validly signed Stripe event."""
+
+
+def handles(*event_types):
+    """Register the decorated function to apply events of `event_types`; it receives the event's data object."""
+    def decorator(func):
+        for event_type in event_types:
+            _handlers[event_type] = func
+        return func
+    return decorator
+
+
+def verify_event(payload, signature):
+    """Check a webhook body against its `Stripe-Signature` header and return the event."""
+    if not STRIPE_WEBHOOK_SECRET:
+        raise WebhookError("Webhook secret is not configured")
+    try:
+        stripe.WebhookSignature.verify_header(payload.decode("utf-8"), signature or "", STRIPE_WEBHOOK_SECRET)
+        event = json.loads(payload)
+    except (stripe.SignatureVerificationError, UnicodeDecodeError, ValueError):
+        raise WebhookError("Invalid webhook signature or payload")
+    if not isinstance(event, dict) or not event.get("id") or not event.get("type"):
+        raise WebhookError("Invalid webhook payload")
+    return event
+
+
+def enqueue(event):
+    """Durably queue a verified event for the worker; an event already queued is left as it is."""
+    now = time.time()
+    EVENTS.update(event["id"], lambda record: record or {
+        "event": event,
+        "status": "pending",
+        "attempts": 0,
+        "received": now,
+        "next_attempt": now,
+    })
+    start_worker()
+    _wakeup.set()
+
+
+def _claim(event_id, now):
+    """Take the lease on an event; returns its record, or None if it is not ready or another worker has it."""
+    claimed = []
+
+    def claim(record):
+        if record is None:
+            raise LookupError(event_id)
+        ready = (record["status"] == "pending" and record["next_attempt"] <= now) or \
+                (record["status"] == "processing" and record["lease_until"] <= now)
+        if not ready:
+            return record
+        claimed.append(True)
+        return {**record, "status": "processing", "worker": WORKER_ID, "lease_until": now + LEASE}
+
+    try:
+        record = EVENTS.update(event_id, claim)
+    except LookupError:
+        return None
+    return record if claimed else None
+
+
+def _apply(event_id, record):
+    event = record["event"]
+    try:
+        handler = _handlers.get(event["type"])
+        if handler:
+            handler(event["data"]["object"])
+        EVENTS.update(event_id, lambda record: DELETE if record is None else
+                      {**record, "status": "done", "processed": time.time()})
+    except Exception as e:
+        attempts = record["attempts"] + 1
+        logger.exception("Webhook event %s failed (attempt %d)", event_id, attempts)
+        EVENTS.update(event_id, lambda record: DELETE if record is None else {
+            **record,
+            "status": "failed" if attempts >= MAX_ATTEMPTS else "pending",
+            "attempts": attempts,
+            "error": str(e),
+            "next_attempt": time.time() + RETRY_DELAY * 2 ** (attempts - 1),
+        })
+
+
+def process_pending():
+    """Apply every event that is due. Returns how many were applied."""
+    now = time.time()
+    candidates = [
+        (event_id, record) for status in ("pending", "processing") for event_id, record in EVENTS.find("status", status)
+    ]
+    applied = 0
+    for event_id, record in sorted(candidates, key=lambda item: item[1]["received"]):
+        ready = record["next_attempt"] <= now if record["status"] == "pending" else record["lease_until"] <= now
+        if ready:
+            record = _claim(event_id, now)
+            if record is not None:
+                _apply(event_id, record)
+                applied += 1
+
+    cutoff = now - EVENT_RETENTION
+    for event_id, record in EVENTS.find("status", "done"):
+        if record.get("processed", 0) < cutoff:
+            EVENTS.delete(event_id)
+    return applied
+
+
+def _work_loop():
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            process_pending()
+        except Exception:
+            logger.exception("Webhook worker error")
+
+
+def start_worker():
+    """Start this process's webhook worker thread, which also resumes events queued before a restart."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work_loop, name="webhook-worker", daemon=True)
+            _worker.start()
+
+
+def _format_address(address):
+    if not address:
+        return None
+    city = " ".join(part for part in (address.get("city"), address.get("state"), address.get("postal_code")) if part)
+    lines = (address.get("line1"), address.get("line2"), city, address.get("country"))
+    return "\n".join(line for line in lines if line)
+
+
+@handles("checkout.session.completed", "checkout.session.async_payment_succeeded")
+def _checkout_paid(session):
+    if session.get("payment_status") != "paid":
+        return  # Delayed payment methods complete later with async_payment_succeeded
+
+    metadata = session.get("metadata") or {}
+    quantities = json.loads(metadata.get("items") or "{}")
+    names = {str(product.get("id")): product.get("name") for product in get_products(quantities)}
+    details = session.get("shipping_details") or session.get("customer_details") or {}
+
+    order_id, created = create_order({
+        "user_id": metadata.get("user_id"),
+        "products": [
+            {"id": product_id, "name": names.get(product_id), "quantity": quantity}
+            for product_id, quantity in quantities.items()
+        ],
+        "amount_total": session.get("amount_total"),
+        "currency": session.get("currency"),
+        "shipping_address": _format_address(details.get("address")),
+        "status": "paid",
+    }, checkout_session=session["id"])
+
+    if created and metadata.get("user_id"):
+        publish(f"user:{metadata['user_id']}", {"type": "order", "order_id": order_id})
@@ -0,0 +1,3 @@
+from .collection import Collection, ConflictError, DELETE, get_collection, compact_all, DB_FOLDER, STORAGE_BACKEND
+
+__all__ = ["Collection", "ConflictError", "DELETE", "get_collection", "compact_all", "DB_FOLDER", "STORAGE_BACKEND"]
@@ -0,0 +1,41 @@
+import time
+
+from .collection import get_collection
+
+ACCOUNTS = get_collection("accounts")
+
+
+def normalize_email(email):
+    """Trim and case-fold an email address so lookups ignore case."""
+    if not email:
+        return None
+    return email.strip().lower()
+
+
+ACCOUNTS.add_index("email", lambda account: normalize_email(account.get("email")), unique=True)
+
+
+def find_by_email(email):
+    """Return the account registered with `email` (ignoring case), or None."""
+    return ACCOUNTS.find_one("email", normalize_email(email))
+
+
+def public_profiles(user_ids):
+    """Return `{user_id: {"id", "username", "pfp"}}` for the accounts that exist, in one lookup."""
+    return {
+        user_id: {"id": user_id, "username": account.get("username"), "pfp": account.get("pfp")}
+        for user_id, account in ACCOUNTS.get_many({str(user_id) for user_id in user_ids if user_id is not None}).items()
+    }
+
+
+def usernames(user_ids):
+    """Return `{user_id: username}` for the accounts that exist, in one lookup."""
+    return {user_id: profile["username"] for user_id, profile in public_profiles(user_ids).items()}
+
+
+def is_disabled(account, now=None):
+    """Whether `account` is disabled right now; a disable with a past `disabled_until` has lapsed."""
+    if not account or not account.get("disabled"):
+        return False
+    until = account.get("disabled_until")
+    return until is None or until > (time.time() if now is None else now)
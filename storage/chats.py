@@ -0,0 +1,226 @@
+"""
+Chat storage.
+
+The logs collection keeps one small record per conversation (the two users,
+the message count and the last message). The messages themselves are
+appended to `db/chats/<chat_key>/<segment>.jsonl`, SEGMENT_SIZE per file,
+already in timestamp order, so a page of history only reads the segments it
+needs. Chats still holding an inline `logs` list are moved into segments the
+first time they are touched.
+
+Segment files are written before the record that counts their lines, so a
+failed or interrupted write can leave lines no record covers. The record's
+`message_count` and `segment_offset` (where the last segment's counted lines
+end) are authoritative: readers ignore lines past them, and the next append
+truncates them away first.
+"""
+import os
+import json
+
+from .collection import get_collection, ConflictError, DELETE, DB_FOLDER
+from .ids import next_id
+
+LOGS = get_collection("logs")
+CHATS_FOLDER = os.path.join(DB_FOLDER, "chats")
+SEGMENT_SIZE = 500
+
+
+def chat_pair(user1, user2):
+    """Canonical key for the conversation between two users, whichever started it."""
+    return tuple(sorted((str(user1), str(user2))))
+
+
+LOGS.add_index("pair", lambda chat: chat_pair(chat["user1"], chat["user2"]), unique=True)
+LOGS.add_index("user", lambda chat: (str(chat["user1"]), str(chat["user2"])), multi=True)
+
+
+def find_chat(user1, user2):
+    """Return the key of the chat between `user1` and `user2`, or None."""
+    keys = LOGS.find_keys("pair", chat_pair(user1, user2))
+    return min(keys) if keys else None
+
+
+def user_chats(user_id):
+    """Return `(chat_key, chat)` for every chat `user_id` takes part in."""
+    return LOGS.find("user", str(user_id))
+
+
+def _segment_path(chat_key, segment):
+    return os.path.join(CHATS_FOLDER, str(chat_key), f"{segment:06d}.jsonl")
+
+
+def _line_offset(path, lines):
+    """Byte offset just past the first `lines` complete lines of `path`."""
+    offset = 0
+    try:
+        with open(path, "rb") as file:
+            for _ in range(lines):
+                line = file.readline()
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+    except FileNotFoundError:
+        pass
+    return offset
+
+
+def _reconcile(chat_key, count, offset=None):
+    """
+    Cut the chat's segment files back to its first `count` messages and return
+    the offset where the next one goes. `offset` is where the counted lines of
+    the last segment end, if the record knows it.
+    """
+    segment = count // SEGMENT_SIZE
+    path = _segment_path(chat_key, segment)
+    if offset is None:
+        offset = _line_offset(path, count % SEGMENT_SIZE)
+    if os.path.exists(path) and os.path.getsize(path) > offset:
+        with open(path, "r+b") as file:
+            file.truncate(offset)
+    later = segment + 1
+    while os.path.exists(_segment_path(chat_key, later)):
+        os.remove(_segment_path(chat_key, later))
+        later += 1
+    return offset
+
+
+def _append_to_segments(chat_key, chat, messages, stored=None):
+    """
+    Append messages after the chat's existing ones and update its summary
+    fields. The messages as stored are added to the `stored` list, if given.
+    """
+    count = chat.get("message_count", 0)
+    last = chat.get("last_message")
+    os.makedirs(os.path.join(CHATS_FOLDER, str(chat_key)), exist_ok=True)
+    offset = _reconcile(chat_key, count, chat.get("segment_offset"))
+
+    segment, file = None, None
+    try:
+        for message in messages:
+            # Never let a message sort before the one already stored last
+            if last and message["timestamp"] < last["timestamp"]:
+                message = {**message, "timestamp": last["timestamp"]}
+            if count // SEGMENT_SIZE != segment:
+                if file:
+                    file.close()
+                segment = count // SEGMENT_SIZE
+                file = open(_segment_path(chat_key, segment), "ab")
+            file.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            count += 1
+            last = message
+            if stored is not None:
+                stored.append(message)
+        if file:
+            offset = file.tell()
+    finally:
+        if file:
+            file.flush()
+            os.fsync(file.fileno())
+            file.close()
+
+    chat["message_count"] = count
+    chat["last_message"] = last
+    # A full last segment means the next message starts a new file
+    chat["segment_offset"] = 0 if count % SEGMENT_SIZE == 0 else offset
+    return chat
+
+
+def _upgrade(chat_key, chat):
+    """Move a legacy inline `logs` list into segment files, replacing any left by an earlier attempt."""
+    if chat is None or "logs" not in chat:
+        return chat
+    messages = sorted(chat.pop("logs"), key=lambda x: x["timestamp"])
+    chat["message_count"] = 0
+    chat["last_message"] = None
+    chat["segment_offset"] = 0
+    return _append_to_segments(chat_key, chat, messages)
+
+
+def get_chat(chat_key):
+    """Return the chat record, upgrading it to segments first if needed."""
+    chat = LOGS.get(chat_key)
+    if chat is not None and "logs" in chat:
+        chat = LOGS.update(chat_key, lambda chat: DELETE if chat is None else _upgrade(chat_key, chat))
+    return chat
+
+
+def add_messages(chat_key, *messages):
+    """
+    Append messages to an existing chat without losing concurrent writes and
+    return them as stored, since a timestamp may have been moved forward to
+    keep the chat in order. Raises LookupError if the chat does not exist.
+    """
+    stored = []
+
+    def change(chat):
+        if chat is None:
+            raise LookupError(f"Chat {chat_key} does not exist")
+        stored.clear()
+        return _append_to_segments(chat_key, _upgrade(chat_key, chat), messages, stored)
+
+    LOGS.update(chat_key, change)
+    return stored
+
+
+def create_chat(user1, user2, *messages):
+    """
+    Create the chat between two users, or append to it if another request just
+    created it. Returns `(chat_key, stored_messages)`.
+    """
+    chat_key = next_id(LOGS)
+    try:
+        LOGS.put(chat_key, {"user1": str(user1), "user2": str(user2), "message_count": 0, "last_message": None,
+                            "segment_offset": 0})
+    except ConflictError:
+        chat_key = find_chat(user1, user2)
+    stored = add_messages(chat_key, *messages) if messages else []
+    return chat_key, stored
+
+
+def _read_segment(chat_key, segment, count):
+    """Read the messages of one segment, ignoring lines past the chat's first `count` messages."""
+    lines = min(SEGMENT_SIZE, count - segment * SEGMENT_SIZE)
+    messages = []
+    try:
+        with open(_segment_path(chat_key, segment), "r", encoding="utf-8") as file:
+            for line in file:
+                if len(messages) >= lines or not line.endswith("\n"):
+                    break
+                if line.strip():
+                    messages.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return messages
+
+
+def get_messages(chat_key, before=None, after=None, limit=None):
+    """
+    Return `(messages, has_more)` for one chat, oldest first.
+
+    With `after`, return the first `limit` messages newer than that timestamp;
+    otherwise return the last `limit` messages older than `before` (or the
+    newest ones). Without `limit`, return every matching message.
+    """
+    chat = get_chat(chat_key)
+    if chat is None:
+        return [], False
+    count = chat.get("message_count", 0)
+    segments = range((count + SEGMENT_SIZE - 1) // SEGMENT_SIZE)
+
+    collected = []
+    if after is not None:
+        for segment in reversed(segments):
+            messages = _read_segment(chat_key, segment, count)
+            collected = [m for m in messages if m["timestamp"] > after] + collected
+            if messages and messages[0]["timestamp"] <= after:
+                break
+        page = collected if limit is None else collected[:limit]
+    else:
+        for segment in reversed(segments):
+            messages = _read_segment(chat_key, segment, count)
+            collected = [m for m in messages if before is None or m["timestamp"] < before] + collected
+            if limit is not None and len(collected) > limit:
+                break
+        page = collected if limit is None else collected[len(collected) - limit:]
+
+    return page, len(page) < len(collected)
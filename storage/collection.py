@@ -0,0 +1,405 @@
+import os
+import copy
+import logging
+import threading
+from bisect import bisect_left, insort
+
+logger = logging.getLogger(__name__)
+
+# Database path: ../db unless CLOOP_DB_FOLDER points elsewhere (the tests use a scratch folder)
+DB_FOLDER = os.path.abspath(os.environ.get("CLOOP_DB_FOLDER", os.path.join(os.path.dirname(__file__), "../db")))
+
+# "json" keeps db/<name>.json + journal files, "sqlite" uses db/cloop.sqlite3
+STORAGE_BACKEND = os.environ.get("CLOOP_STORAGE_BACKEND", "json")
+
+# Compact a collection once it has this many uncompacted mutations,
+# or every COMPACT_INTERVAL seconds if it has any at all.
+COMPACT_THRESHOLD = 1000
+COMPACT_INTERVAL = 60
+
+_collections = {}
+_collections_lock = threading.Lock()
+_compactor = None
+_compact_wakeup = threading.Event()
+
+
+# Returned by an `update` change function to delete the record instead
+DELETE = object()
+
+
+class ConflictError(Exception):
+    """Raised when a write expected a record version that is no longer current."""
+
+
+class Index:
+    """
+    Secondary index from a value derived from each record to the keys of the records.
+
+    It remembers which values each key was indexed under, so records that
+    callers mutated in place before `put` are still unindexed correctly.
+    With `sort_key`, it also keeps a sorted list of keys (postings) per value.
+    """
+
+    def __init__(self, key_func, multi=False, unique=False, sort_key=None):
+        self.key_func = key_func
+        self.multi = multi
+        self.unique = unique
+        self.sort_key = sort_key
+        self.entries = {}
+        self.indexed = {}
+        self.postings = {}
+
+    def values_for(self, record):
+        """Return the set of index values for `record` (several if the index is `multi`)."""
+        if record is None:
+            return set()
+        value = self.key_func(record)
+        if self.multi:
+            return set(value or ())
+        return set() if value is None else {value}
+
+    def add(self, key, record):
+        values = self.values_for(record)
+        if values:
+            self.indexed[key] = values
+        for value in values:
+            self.entries.setdefault(value, set()).add(key)
+            if self.sort_key is not None:
+                insort(self.postings.setdefault(value, []), key, key=self.sort_key)
+
+    def remove(self, key):
+        for value in self.indexed.pop(key, ()):
+            keys = self.entries.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.entries[value]
+            postings = self.postings.get(value)
+            if postings is not None:
+                position = bisect_left(postings, self.sort_key(key), key=self.sort_key)
+                if position < len(postings) and postings[position] == key:
+                    del postings[position]
+                if not postings:
+                    del self.postings[value]
+
+    def rebuild(self, data):
+        self.entries = {}
+        self.indexed = {}
+        self.postings = {}
+        for key, record in data.items():
+            self.add(key, record)
+
+
+class Collection:
+    """
+    In-memory copy of one collection, kept in sync with its storage backend.
+
+    Reads are served from memory after a cheap check for writes made by other
+    processes. Records handed out by `get`/`items`/`values` are the cached
+    objects, so callers must copy them before adding response-only fields.
+
+    Every mutation gets the next sequence number of the collection. Writers
+    hold the backend's cross-process lock and catch up before writing, so use
+    `update` for read-modify-write, or pass `if_version` to `put` for
+    optimistic checks.
+
+    Secondary indexes registered with `add_index` are kept up to date on every
+    mutation, including ones picked up from other processes.
+
+    Backends implement `_refresh`, `_transaction`, `_persist` and `compact`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.RLock()
+        self._data = {}
+        self._versions = {}
+        self._seq = 0
+        self._pending = 0
+        self._indexes = {}
+
+    def _refresh(self):
+        """Pick up writes made by other processes. Called with `_lock` held."""
+        raise NotImplementedError
+
+    def _transaction(self):
+        """Context manager holding the cross-process writer lock. Called with `_lock` held."""
+        raise NotImplementedError
+
+    def _persist(self, entry):
+        """Durably record one mutation. Called inside `_transaction`."""
+        raise NotImplementedError
+
+    def compact(self):
+        """Fold pending mutations into the backend's compact form. Returns True if it did any work."""
+        return False
+
+    def _reindex(self):
+        """Rebuild every secondary index after the data was reloaded wholesale."""
+        for index in self._indexes.values():
+            index.rebuild(self._data)
+
+    def _apply(self, entry):
+        """Apply one mutation entry to the in-memory data."""
+        seq = entry.get("seq", self._seq + 1)
+        if entry["op"] in ("put", "del"):
+            for index in self._indexes.values():
+                index.remove(entry["key"])
+        if entry["op"] == "put":
+            self._data[entry["key"]] = entry["value"]
+            self._versions[entry["key"]] = seq
+            for index in self._indexes.values():
+                index.add(entry["key"], entry["value"])
+        elif entry["op"] == "del":
+            self._data.pop(entry["key"], None)
+            self._versions.pop(entry["key"], None)
+        elif entry["op"] == "base":
+            for key in self._data:
+                self._versions[key] = seq
+        self._seq = max(self._seq, seq)
+
+    def _check_unique(self, key, record):
+        """Raise ConflictError if `record` would take a unique index value owned by another record."""
+        for name, index in self._indexes.items():
+            if not index.unique:
+                continue
+            for value in index.values_for(record) - index.indexed.get(key, set()):
+                if index.entries.get(value, set()) - {key}:
+                    raise ConflictError(f"{self.name}.{name} '{value}' is already taken")
+
+    def _write(self, op, key, value=None):
+        """Persist and apply one mutation. Called inside `_transaction` after `_refresh`."""
+        if op == "put":
+            self._check_unique(key, value)
+        entry = {"op": op, "key": key, "seq": self._seq + 1}
+        if op == "put":
+            entry["value"] = value
+        self._persist(entry)
+        self._apply(entry)
+
+        self._pending += 1
+        _start_compactor()
+        if self._pending >= COMPACT_THRESHOLD:
+            _compact_wakeup.set()
+
+    def add_index(self, name, key_func, multi=False, unique=False, sort_key=None):
+        """
+        Register a secondary index called `name`; registering the same name again is a no-op.
+
+        `key_func(record)` returns the indexed value (None to skip the record),
+        or an iterable of values when `multi` is set. Puts that would give a
+        `unique` value to a second record raise ConflictError. With
+        `sort_key(key)`, `postings` returns each value's keys in that order.
+        """
+        self.register_index(name, Index(key_func, multi=multi, unique=unique, sort_key=sort_key))
+
+    def register_index(self, name, index):
+        """
+        Register a ready-made index object called `name`, unless one already exists.
+
+        It must provide `unique`, `values_for`, `indexed`, `add`, `remove` and
+        `rebuild` like `Index`; the collection calls them on every mutation.
+        """
+        with self._lock:
+            if name not in self._indexes:
+                index.rebuild(self._data)
+                self._indexes[name] = index
+
+    def with_index(self, name, func):
+        """Return `func(index)` for the index called `name`, run against current data under the lock."""
+        with self._lock:
+            self._refresh()
+            return func(self._indexes[name])
+
+    def find_keys(self, index, value):
+        """Return the keys of the records whose `index` value is `value`."""
+        with self._lock:
+            self._refresh()
+            return list(self._indexes[index].entries.get(value, ()))
+
+    def find(self, index, value):
+        """Return `(key, record)` for every record whose `index` value is `value`."""
+        with self._lock:
+            self._refresh()
+            return [(key, self._data[key]) for key in self._indexes[index].entries.get(value, ())]
+
+    def postings(self, index, value):
+        """Return the keys whose `index` value is `value`, ordered by the index's `sort_key`."""
+        with self._lock:
+            self._refresh()
+            return list(self._indexes[index].postings.get(value, ()))
+
+    def index_counts(self, index):
+        """Return `{value: number of records}` for every value in `index`."""
+        with self._lock:
+            self._refresh()
+            return {value: len(keys) for value, keys in self._indexes[index].entries.items()}
+
+    def find_one(self, index, value):
+        """Return one record whose `index` value is `value`, or None."""
+        with self._lock:
+            self._refresh()
+            keys = self._indexes[index].entries.get(value)
+            return self._data[min(keys)] if keys else None
+
+    @property
+    def version(self):
+        """Sequence number of the latest mutation applied to this collection."""
+        with self._lock:
+            self._refresh()
+            return self._seq
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._refresh()
+            return self._data.get(str(key), default)
+
+    def get_many(self, keys):
+        """Return `{key: record}` for the keys that exist, under a single refresh."""
+        with self._lock:
+            self._refresh()
+            found = {}
+            for key in keys:
+                record = self._data.get(str(key))
+                if record is not None:
+                    found[str(key)] = record
+            return found
+
+    def get_versioned(self, key):
+        """Return `(record, version)` for use with `put(..., if_version=version)`."""
+        with self._lock:
+            self._refresh()
+            return self._data.get(str(key)), self._versions.get(str(key))
+
+    def __contains__(self, key):
+        with self._lock:
+            self._refresh()
+            return str(key) in self._data
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._data)
+
+    def keys(self):
+        with self._lock:
+            self._refresh()
+            return list(self._data.keys())
+
+    def values(self):
+        with self._lock:
+            self._refresh()
+            return list(self._data.values())
+
+    def items(self):
+        with self._lock:
+            self._refresh()
+            return list(self._data.items())
+
+    def put(self, key, record, if_version=None):
+        """
+        Insert or replace a record.
+
+        With `if_version` (as returned by `get_versioned`), raise ConflictError if
+        the record has been written by anyone since it was read.
+        """
+        key = str(key)
+        with self._lock, self._transaction():
+            self._refresh()
+            if if_version is not None and self._versions.get(key) != if_version:
+                raise ConflictError(f"{self.name}/{key} changed since version {if_version}")
+            self._write("put", key, record)
+
+    def update(self, key, change, default=None):
+        """
+        Atomically read-modify-write one record.
+
+        `change` receives a private copy of the latest record (or `default`) and
+        returns the new record, or DELETE to remove it; returning None raises
+        ValueError, since that is almost always a change function that did not
+        expect the record to be missing. It runs while holding the writer lock,
+        after catching up with every other worker's writes, so keep it short.
+        Returns the new record (None if it was deleted).
+        """
+        key = str(key)
+        with self._lock, self._transaction():
+            self._refresh()
+            record = change(copy.deepcopy(self._data.get(key, default)))
+            if record is None:
+                raise ValueError(f"Update of {self.name}/{key} returned None; return DELETE to remove a record")
+            if record is DELETE:
+                if key in self._data:
+                    self._write("del", key)
+                return None
+            self._write("put", key, record)
+            return record
+
+    def delete(self, key, if_version=None):
+        """
+        Remove a record. Returns False if it did not exist.
+
+        With `if_version`, raise ConflictError if the record has been written since it was read.
+        """
+        key = str(key)
+        with self._lock, self._transaction():
+            self._refresh()
+            if key not in self._data:
+                return False
+            if if_version is not None and self._versions.get(key) != if_version:
+                raise ConflictError(f"{self.name}/{key} changed since version {if_version}")
+            self._write("del", key)
+            return True
+
+    def import_records(self, records):
+        """Bulk insert or replace records in a single transaction."""
+        with self._lock, self._transaction():
+            self._refresh()
+            for key, record in records.items():
+                self._write("put", str(key), record)
+
+
+def _backend_class(backend):
+    # Imported here because the backends subclass Collection
+    if backend == "json":
+        from .journal import JsonCollection
+        return JsonCollection
+    if backend == "sqlite":
+        from .sqlite import SqliteCollection
+        return SqliteCollection
+    raise ValueError(f"Unknown storage backend '{backend}'")
+
+
+def get_collection(name):
+    """Return the shared `Collection` for `name` on the configured backend, creating it on first use."""
+    with _collections_lock:
+        if name not in _collections:
+            _collections[name] = _backend_class(STORAGE_BACKEND)(name)
+        return _collections[name]
+
+
+def compact_all():
+    """Compact every collection opened by this process. Returns the names that were rewritten."""
+    with _collections_lock:
+        collections = list(_collections.values())
+    return [collection.name for collection in collections if collection.compact()]
+
+
+def _compact_loop():
+    while True:
+        _compact_wakeup.wait(COMPACT_INTERVAL)
+        _compact_wakeup.clear()
+        try:
+            compact_all()
+        except Exception:
+            logger.exception("Error compacting collections")
+
+
+def _start_compactor():
+    """Start the background compaction thread on the first write."""
+    global _compactor
+    if _compactor is not None:
+        return
+    with _collections_lock:
+        if _compactor is None:
+            _compactor = threading.Thread(target=_compact_loop, name="storage-compactor", daemon=True)
+            _compactor.start()
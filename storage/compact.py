@@ -0,0 +1,27 @@
+"""
+Fold every `db/<name>.journal` back into its `db/<name>.json` snapshot.
+
+Run this before pointing admin tooling (e.g. `dummycode.py`) at the JSON files:
+
+    python -m storage.compact
+"""
+import os
+import glob
+
+from .collection import DB_FOLDER
+from .journal import JsonCollection
+
+
+def compact_folder(folder=DB_FOLDER):
+    """Compact all collections that have a journal in `folder`."""
+    compacted = []
+    for journal_path in sorted(glob.glob(os.path.join(folder, "*.journal"))):
+        name = os.path.splitext(os.path.basename(journal_path))[0]
+        if JsonCollection(name, folder).compact():
+            compacted.append(name)
+    return compacted
+
+
+if __name__ == "__main__":
+    for name in compact_folder():
+        print(f"✅ Compacted {name}")
@@ -0,0 +1,31 @@
+"""
+ID allocation.
+
+Every collection's last issued ID lives in the `sequences` collection and is
+advanced with `update`, which holds the cross-process writer lock, so two
+workers can never hand out the same ID. IDs only ever grow, so a deleted
+record's ID is never reused. The first allocation for a collection starts
+after its largest existing numeric key.
+"""
+from .collection import get_collection
+
+SEQUENCES = get_collection("sequences")
+
+
+def _largest_key(collection):
+    return max((int(key) for key in collection.keys() if key.isdigit()), default=0)
+
+
+def next_id(collection):
+    """Allocate and return the next ID (as a string) for records of `collection`."""
+    def advance(last):
+        if last is None:
+            last = _largest_key(collection)
+        return last + 1
+
+    return str(SEQUENCES.update(collection.name, advance))
+
+
+def id_order(key):
+    """Sort key for record keys: numeric keys in numeric order, then any others."""
+    return (0, int(key), "") if key.isdigit() else (1, 0, key)
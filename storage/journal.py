@@ -0,0 +1,177 @@
+import os
+import json
+from contextlib import contextmanager
+
+from .collection import Collection, DB_FOLDER
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# fsync every journal append. Turning this off trades durability of the last
+# few writes on power loss for lower write latency; the files stay consistent.
+FSYNC_JOURNAL = True
+
+
+def _fsync_dir(folder):
+    """Persist a rename inside `folder`. Not supported on every platform."""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write):
+    """Write a file via temp file + fsync + rename so readers never see it half written."""
+    folder = os.path.dirname(path)
+    tmp_path = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _fsync_dir(folder)
+
+
+class JsonCollection(Collection):
+    """
+    Collection stored as `db/<name>.json` plus an append-only `db/<name>.journal`.
+
+    The JSON file is the snapshot and the journal holds one JSON line per
+    mutation since the last compaction. Loading replays the journal on top of
+    the snapshot; afterwards only newly appended lines are read, so writes from
+    other processes are picked up in O(change). Writers serialise on an fcntl
+    lock on `db/<name>.lock`. Compaction rewrites the snapshot atomically and
+    starts a new journal with a base marker so the sequence survives it.
+    """
+
+    def __init__(self, name, folder=DB_FOLDER):
+        super().__init__(name)
+        self.folder = folder
+        self.path = os.path.join(folder, f"{name}.json")
+        self.journal_path = os.path.join(folder, f"{name}.journal")
+        self.lock_path = os.path.join(folder, f"{name}.lock")
+        self._lock_file = None
+        self._lock_depth = 0
+        self._signature = None
+        self._journal_inode = None
+        self._journal_offset = 0
+        self._loaded = False
+
+    @contextmanager
+    def _transaction(self):
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, "a")
+        if self._lock_depth == 0:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _stat(self):
+        """Return a cheap fingerprint of the snapshot on disk, or None if it is missing."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _journal_stat(self):
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None, 0
+        return stat.st_ino, stat.st_size
+
+    def _replay_journal(self):
+        """
+        Apply every complete journal line written after `_journal_offset`.
+
+        Returns False if the journal ends in an incomplete line.
+        """
+        with open(self.journal_path, "rb") as file:
+            file.seek(self._journal_offset)
+            for line in file:
+                if not line.endswith(b"\n"):
+                    return False
+                self._journal_offset += len(line)
+                if line.strip():
+                    entry = json.loads(line)
+                    self._apply(entry)
+                    if entry["op"] != "base":
+                        self._pending += 1
+        return True
+
+    def _refresh(self):
+        """Reload the snapshot if it changed, then replay any new journal lines."""
+        signature = self._stat()
+        journal_inode, journal_size = self._journal_stat()
+
+        if (not self._loaded or signature != self._signature
+                or journal_inode != self._journal_inode or journal_size < self._journal_offset):
+            if signature is None:
+                self._data = {}
+            else:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self._data = json.load(file)
+            self._versions = dict.fromkeys(self._data, 0)
+            self._seq = 0
+            self._pending = 0
+            self._reindex()
+            self._signature = signature
+            self._journal_inode = journal_inode
+            self._journal_offset = 0
+            self._loaded = True
+
+        if journal_size > self._journal_offset and not self._replay_journal() and self._lock_depth:
+            # We hold the writer lock, so the partial line is a write torn by a crash
+            with open(self.journal_path, "r+b") as file:
+                file.truncate(self._journal_offset)
+
+    def _persist(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.journal_path, "ab") as file:
+            start = file.tell()
+            file.write(line)
+            file.flush()
+            if FSYNC_JOURNAL:
+                os.fsync(file.fileno())
+        if self._journal_inode is None:
+            self._journal_inode = self._journal_stat()[0]
+        if start == self._journal_offset:
+            self._journal_offset += len(line)
+
+    def compact(self):
+        """Fold the journal into `db/<name>.json` so the snapshot is current on its own."""
+        with self._lock, self._transaction():
+            self._refresh()
+            if self._pending == 0:
+                return False
+            data = self._data
+            base = (json.dumps({"op": "base", "seq": self._seq}) + "\n").encode("utf-8")
+            atomic_write(self.path, lambda file: json.dump(data, file, indent=4, ensure_ascii=False))
+            # Start a fresh journal that remembers where the sequence got to
+            atomic_write(self.journal_path, lambda file: file.write(base.decode("utf-8")))
+            self._signature = self._stat()
+            self._journal_inode = self._journal_stat()[0]
+            self._journal_offset = len(base)
+            self._pending = 0
+            return True
@@ -0,0 +1,74 @@
+"""
+One-shot import of the shelve `.db` files and the JSON collections into SQLite.
+
+Shelve records are imported first and the JSON collections (snapshot plus any
+journal) are layered on top, since they are the newer generation. Every
+collection in INDEXED_FIELDS is imported, plus any other collection found in
+`db/`, so none is left behind:
+
+    python -m storage.migrate
+
+Then start the app with `CLOOP_STORAGE_BACKEND=sqlite`.
+"""
+import os
+import glob
+import shelve
+
+from .collection import DB_FOLDER
+from .journal import JsonCollection
+from .sqlite import INDEXED_FIELDS, SQLITE_PATH, SqliteCollection
+
+COLLECTIONS = list(INDEXED_FIELDS)
+
+
+def read_shelve(name, folder=DB_FOLDER):
+    """Read a shelve database if one exists and this platform's dbm can open it."""
+    db_path = os.path.join(folder, name)
+    dbm_files = [path for path in glob.glob(db_path + ".*") if not path.endswith((".json", ".journal", ".lock"))]
+    if not dbm_files and not os.path.exists(db_path):
+        return {}
+    try:
+        with shelve.open(db_path, flag="r") as db:
+            return dict(db)
+    except Exception as e:
+        print(f"⚠️  Could not read shelve {db_path}: {e}")
+        return {}
+
+
+def read_json(name, folder=DB_FOLDER):
+    """Read a JSON collection including any journal that has not been compacted yet."""
+    return dict(JsonCollection(name, folder).items())
+
+
+def stored_collections(folder=DB_FOLDER):
+    """Names of the JSON collections in `folder`, including ones that only have a journal so far."""
+    names = set()
+    for pattern in ("*.json", "*.journal"):
+        for path in glob.glob(os.path.join(folder, pattern)):
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name.isidentifier():
+                names.add(name)
+    return names
+
+
+def migrate(collections=None, folder=DB_FOLDER, path=SQLITE_PATH):
+    """
+    Import collections into SQLite: `collections`, or by default COLLECTIONS
+    plus every other collection stored in `folder`. Returns the number of
+    records imported per collection.
+    """
+    if collections is None:
+        collections = COLLECTIONS + sorted(stored_collections(folder) - set(COLLECTIONS))
+    counts = {}
+    for name in collections:
+        records = read_shelve(name, folder)
+        records.update(read_json(name, folder))
+        SqliteCollection(name, path).import_records(records)
+        counts[name] = len(records)
+    return counts
+
+
+if __name__ == "__main__":
+    for name, count in migrate().items():
+        print(f"✅ Imported {count} {name} records")
+    print(f"\n🎯 Migration complete. Set CLOOP_STORAGE_BACKEND=sqlite to use {SQLITE_PATH}.")
@@ -0,0 +1,69 @@
+"""
+Orders.
+
+Orders are indexed by user, with each user's order keys kept sorted by ID,
+so a page of someone's order history is a slice of their postings list
+rather than a scan of every order. Orders created from a Stripe Checkout
+session are unique per session, so processing the same payment twice
+returns the existing order instead of creating a second one.
+"""
+import time
+from bisect import bisect_left
+
+from .collection import get_collection, ConflictError
+from .ids import next_id, id_order
+
+ORDERS = get_collection("orders")
+
+DEFAULT_PAGE_SIZE = 20
+
+ORDERS.add_index("user", lambda order: None if order.get("user_id") is None else str(order["user_id"]), sort_key=id_order)
+ORDERS.add_index("checkout_session", lambda order: order.get("checkout_session"), unique=True)
+# Every order under one value, to page through all of them by ID
+ORDERS.add_index("all", lambda order: True, sort_key=id_order)
+
+
+def create_order(order, checkout_session=None):
+    """
+    Store a new order and return `(order_id, created)`.
+
+    With `checkout_session`, an order already stored for that session is
+    returned with `created` False instead.
+    """
+    if checkout_session is not None:
+        existing = ORDERS.find_keys("checkout_session", checkout_session)
+        if existing:
+            return existing[0], False
+        order = {**order, "checkout_session": checkout_session}
+
+    order_id = next_id(ORDERS)
+    try:
+        ORDERS.put(order_id, {"created": time.time(), **order})
+    except ConflictError:
+        if checkout_session is None:
+            raise
+        # Another worker stored this session's order first
+        return ORDERS.find_keys("checkout_session", checkout_session)[0], False
+    return order_id, True
+
+
+def list_orders(user_id=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return `(orders, next_cursor)` for one page of orders, newest first.
+
+    `orders` is a list of `(order_id, order)`, limited to `user_id`'s orders
+    when given. The page starts after the order `cursor`; `next_cursor` is
+    None on the last page.
+    """
+    index, value = ("all", True) if user_id is None else ("user", str(user_id))
+
+    def read(index):
+        keys = index.postings.get(value, [])
+        end = len(keys) if cursor is None else bisect_left(keys, id_order(str(cursor)), key=id_order)
+        start = max(end - limit, 0)
+        return keys[start:end][::-1], start > 0
+
+    page_keys, has_more = ORDERS.with_index(index, read)
+    records = ORDERS.get_many(page_keys)
+    page = [(key, records[key]) for key in page_keys if key in records]
+    return page, (page_keys[-1] if has_more and page_keys else None)
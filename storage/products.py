@@ -0,0 +1,284 @@
+"""
+Product catalogue queries.
+
+Products are indexed by seller, listing status and tag. The tag index keeps
+each tag's product keys sorted by ID, so AND/OR tag queries are merges of
+sorted postings lists. Each sort order, each filtered view of it and each
+set of tag facet counts that gets queried is cached until the products
+collection changes, so a page is a slice of a precomputed list rather than
+a sort of the whole catalogue.
+"""
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from .collection import get_collection
+from .ids import id_order
+
+PRODUCTS = get_collection("products")
+
+DEFAULT_SORT = "id"
+MAX_PAGE_SIZE = 100
+MAX_CACHED_QUERIES = 64
+
+
+def _name_order(key, product):
+    return (str(product.get("name") or "").lower(), id_order(key))
+
+
+# sort name -> (sort key for (key, product), reverse)
+SORT_ORDERS = {
+    "id": (lambda key, product: id_order(key), False),
+    "-id": (lambda key, product: id_order(key), True),
+    "name": (_name_order, False),
+    "-name": (_name_order, True),
+}
+
+PRODUCTS.add_index("customer", lambda product: None if product.get("customer_id") is None else str(product["customer_id"]))
+PRODUCTS.add_index("listed", lambda product: bool(product.get("is_listed", True)))
+
+
+def product_tags(product):
+    """Return the product's tags with surrounding whitespace removed, ignoring blanks."""
+    return {tag.strip() for tag in product.get("tags") or () if isinstance(tag, str) and tag.strip()}
+
+
+PRODUCTS.add_index("tag", product_tags, multi=True, sort_key=id_order)
+
+# query -> (version, result), least recently used first
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cached(query, build):
+    """Return `build()` for `query`, reusing the last result until products change."""
+    version = PRODUCTS.version
+    with _cache_lock:
+        cached = _cache.get(query)
+        if cached and cached[0] == version:
+            _cache.move_to_end(query)
+            return cached[1]
+
+    result = build()
+    with _cache_lock:
+        _cache[query] = (version, result)
+        _cache.move_to_end(query)
+        while len(_cache) > MAX_CACHED_QUERIES:
+            _cache.popitem(last=False)
+    return result
+
+
+def _intersect(shorter, longer):
+    """Intersect two key lists sorted by ID, binary searching the longer one."""
+    result, low = [], 0
+    for key in shorter:
+        low = bisect_left(longer, id_order(key), lo=low, key=id_order)
+        if low == len(longer):
+            break
+        if longer[low] == key:
+            result.append(key)
+    return result
+
+
+def tag_query(all_tags=(), any_tags=()):
+    """
+    Return the keys of products carrying every tag in `all_tags` and at least
+    one tag in `any_tags`, sorted by ID.
+    """
+    postings = [PRODUCTS.postings("tag", tag) for tag in set(all_tags)]
+    if any_tags:
+        merged = heapq.merge(*(PRODUCTS.postings("tag", tag) for tag in set(any_tags)), key=id_order)
+        postings.append(list(dict.fromkeys(merged)))
+    if not postings:
+        return sorted(PRODUCTS.keys(), key=id_order)
+
+    postings.sort(key=len)
+    keys = postings[0]
+    for other in postings[1:]:
+        keys = _intersect(keys, other)
+    return keys
+
+
+def _filters(tags=None, any_tags=None, customer_id=None, is_listed=None):
+    """Canonical, hashable form of a set of filters."""
+    return (
+        tuple(sorted(set(tags or ()))),
+        tuple(sorted(set(any_tags or ()))),
+        None if customer_id is None else str(customer_id),
+        is_listed,
+    )
+
+
+def _matching_keys(tags, any_tags, customer_id, is_listed):
+    """Return the keys matching every filter that is set."""
+    matching = []
+    if customer_id is not None:
+        matching.append(set(PRODUCTS.find_keys("customer", customer_id)))
+    if is_listed is not None:
+        matching.append(set(PRODUCTS.find_keys("listed", is_listed)))
+    if tags or any_tags:
+        matching.append(set(tag_query(tags, any_tags)))
+    matching.sort(key=len)
+    return set.intersection(*matching)
+
+
+def ordering(sort=DEFAULT_SORT, tags=None, any_tags=None, customer_id=None, is_listed=None):
+    """
+    Return `(keys, positions)` for the products matching the filters in `sort` order.
+
+    Filtered orderings are derived from the unfiltered one without sorting
+    again; tag-only queries by ID come straight from the tag postings.
+    """
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort '{sort}'")
+    filters = _filters(tags, any_tags, customer_id, is_listed)
+    tags, any_tags, customer_id, is_listed = filters
+
+    def build():
+        if filters == ((), (), None, None):
+            sort_key, reverse = SORT_ORDERS[sort]
+            items = sorted(PRODUCTS.items(), key=lambda item: sort_key(*item), reverse=reverse)
+            keys = [key for key, _ in items]
+        elif sort == "id" and customer_id is None and is_listed is None:
+            keys = tag_query(tags, any_tags)
+        else:
+            matching = _matching_keys(tags, any_tags, customer_id, is_listed)
+            keys = [key for key in ordering(sort)[0] if key in matching]
+        return keys, {key: position for position, key in enumerate(keys)}
+
+    return _cached(("ordering", sort, filters), build)
+
+
+def tag_facets(tags=None, any_tags=None, customer_id=None, is_listed=None):
+    """Return `{tag: number of products}` over the products matching the filters."""
+    filters = _filters(tags, any_tags, customer_id, is_listed)
+    if filters == ((), (), None, None):
+        return PRODUCTS.index_counts("tag")
+
+    def build():
+        counts = {}
+        keys = ordering(DEFAULT_SORT, tags, any_tags, customer_id, is_listed)[0]
+        for product in PRODUCTS.get_many(keys).values():
+            for tag in product_tags(product):
+                counts[tag] = counts.get(tag, 0) + 1
+        return counts
+
+    return dict(_cached(("facets", filters), build))
+
+
+def list_products(sort=DEFAULT_SORT, tags=None, any_tags=None, customer_id=None, is_listed=None,
+                  cursor=None, offset=0, limit=None):
+    """
+    Return `(products, next_cursor)` for one page of the catalogue.
+
+    `products` is a list of `(key, product)` pairs in `sort` order, filtered to
+    products carrying every tag in `tags` and at least one in `any_tags`, and
+    matching `customer_id` and `is_listed` when given. The page starts after the product whose key is
+    `cursor`, or at `offset`. `next_cursor` is None on the last page. Raises
+    ValueError if the cursor product no longer exists.
+    """
+    keys, positions = ordering(sort, tags, any_tags, customer_id, is_listed)
+
+    if cursor is None:
+        start = offset
+    elif cursor in positions:
+        start = positions[cursor] + 1
+    else:
+        # The cursor product no longer matches the filters; resume from where it sorts
+        _, all_positions = ordering(sort)
+        if cursor not in all_positions:
+            raise ValueError("Unknown cursor")
+        start = bisect_right([all_positions[key] for key in keys], all_positions[cursor])
+
+    end = len(keys) if limit is None else start + limit
+    page_keys = keys[start:end]
+    records = PRODUCTS.get_many(page_keys)
+    page = [(key, records[key]) for key in page_keys if key in records]
+
+    next_cursor = page_keys[-1] if page_keys and end < len(keys) else None
+    return page, next_cursor
+
+
+def get_products(product_ids):
+    """
+    Return the products with the given IDs in one pass, in the order asked.
+
+    Unknown IDs are skipped; an ID listed twice (two in the cart) is returned twice.
+    """
+    product_ids = [str(product_id) for product_id in product_ids]
+    records = PRODUCTS.get_many(product_ids)
+    return [records[product_id] for product_id in product_ids if product_id in records]
+
+
+def price_cents(product):
+    """Return the product's price in cents, or None if it has no price."""
+    price = product.get("price")
+    return None if price is None else int(round(float(price) * 100))
+
+
+def purchasable(product):
+    """Whether `product` can be checked out: it is listed and has a price."""
+    return product.get("is_listed", True) and price_cents(product) is not None
+
+
+def cart_total(products):
+    """Total price in dollars, summed in cents, of the products that can be checked out."""
+    return sum(price_cents(product) for product in products if purchasable(product)) / 100
+
+
+def _parse_bool(value, name):
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise ValueError(f"'{name}' must be true or false")
+
+
+def parse_filters(args):
+    """
+    Turn request query arguments into filter keyword arguments.
+
+    Understands `tags` (comma separated, all required), `any_tags` (comma
+    separated, at least one required), `customer_id` and `is_listed`.
+    """
+    query = {}
+    for name in ("tags", "any_tags"):
+        if args.get(name):
+            query[name] = [tag.strip() for tag in args[name].split(",") if tag.strip()]
+    if args.get("customer_id"):
+        query["customer_id"] = args["customer_id"]
+    if args.get("is_listed"):
+        query["is_listed"] = _parse_bool(args["is_listed"], "is_listed")
+    return query
+
+
+def parse_page(args, default_limit=None):
+    """Return `{"offset", "limit"}` from request query arguments, leaving out what is not given."""
+    page = {}
+    try:
+        if args.get("offset"):
+            page["offset"] = max(int(args["offset"]), 0)
+        if args.get("limit"):
+            page["limit"] = min(max(int(args["limit"]), 1), MAX_PAGE_SIZE)
+        elif default_limit is not None:
+            page["limit"] = default_limit
+    except ValueError:
+        raise ValueError("'offset' and 'limit' must be integers")
+    return page
+
+
+def parse_query(args):
+    """
+    Turn request query arguments into keyword arguments for `list_products`.
+
+    Understands the filters of `parse_filters` plus `sort`, `cursor`, `offset`
+    and `limit`. Raises ValueError on bad values.
+    """
+    query = {"sort": args.get("sort", DEFAULT_SORT), **parse_filters(args)}
+    if query["sort"] not in SORT_ORDERS:
+        raise ValueError(f"'sort' must be one of {', '.join(SORT_ORDERS)}")
+    if args.get("cursor"):
+        query["cursor"] = args["cursor"]
+    query.update(parse_page(args))
+    return query
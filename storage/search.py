@@ -0,0 +1,191 @@
+"""
+Full-text product search.
+
+Product names, descriptions and tags are tokenized into an inverted index
+that the products collection keeps up to date on every write. Queries match
+products containing every query term, with the last term also matching as a
+prefix for type-ahead, and are ranked with BM25 over field-weighted term
+frequencies.
+"""
+import re
+import math
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+
+from .collection import Index
+from .ids import id_order
+from .products import PRODUCTS, product_tags, _filters, _matching_keys
+
+# Weight of a term occurrence per field, so a match in the name counts more
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "tags": 2.0,
+    "description": 1.0,
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# How many vocabulary terms a type-ahead prefix may expand to
+MAX_PREFIX_TERMS = 50
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-free word tokens."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return TOKEN_PATTERN.findall(text)
+
+
+def _product_fields(product):
+    return {
+        "name": product.get("name"),
+        "tags": " ".join(sorted(product_tags(product))),
+        "description": product.get("description"),
+    }
+
+
+class TextIndex(Index):
+    """
+    Inverted index from token to `{key: weighted term frequency}`.
+
+    Keeps each record's weighted length and a sorted vocabulary for prefix
+    lookups. It plugs into `Collection.register_index`, so it is updated
+    incrementally with every mutation like the other indexes.
+    """
+
+    def __init__(self, fields_func, weights):
+        super().__init__(key_func=None)
+        self.fields_func = fields_func
+        self.weights = weights
+        self.terms = {}
+        self.lengths = {}
+        self.total_length = 0.0
+        self.vocabulary = []
+
+    def values_for(self, record):
+        return set()
+
+    def add(self, key, record):
+        if record is None:
+            return
+        frequencies = {}
+        for field, text in self.fields_func(record).items():
+            for token in tokenize(text):
+                frequencies[token] = frequencies.get(token, 0.0) + self.weights.get(field, 1.0)
+        if not frequencies:
+            return
+
+        self.indexed[key] = frequencies
+        self.lengths[key] = sum(frequencies.values())
+        self.total_length += self.lengths[key]
+        for token, frequency in frequencies.items():
+            if token not in self.terms:
+                self.terms[token] = {}
+                insort(self.vocabulary, token)
+            self.terms[token][key] = frequency
+
+    def remove(self, key):
+        frequencies = self.indexed.pop(key, None)
+        if frequencies is None:
+            return
+        self.total_length -= self.lengths.pop(key)
+        for token in frequencies:
+            postings = self.terms.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self.terms[token]
+                position = bisect_left(self.vocabulary, token)
+                if position < len(self.vocabulary) and self.vocabulary[position] == token:
+                    del self.vocabulary[position]
+
+    def rebuild(self, data):
+        self.indexed = {}
+        self.terms = {}
+        self.lengths = {}
+        self.total_length = 0.0
+        self.vocabulary = []
+        for key, record in data.items():
+            self.add(key, record)
+
+    def expand_prefix(self, prefix):
+        """Return up to MAX_PREFIX_TERMS vocabulary terms starting with `prefix`."""
+        terms = []
+        position = bisect_left(self.vocabulary, prefix)
+        while position < len(self.vocabulary) and len(terms) < MAX_PREFIX_TERMS:
+            term = self.vocabulary[position]
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+            position += 1
+        return terms
+
+    def score(self, query_terms):
+        """
+        Return `{key: BM25 score}` for records matching every entry of `query_terms`.
+
+        Each entry is a list of alternative terms (a word, or a prefix's
+        expansions); a record scores its best alternative per entry.
+        """
+        count = len(self.lengths)
+        if not count or not query_terms:
+            return {}
+        average_length = self.total_length / count
+
+        scores = None
+        for alternatives in sorted(query_terms, key=lambda terms: sum(len(self.terms.get(t, ())) for t in terms)):
+            best = {}
+            for term in alternatives:
+                postings = self.terms.get(term, {})
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    if scores is not None and key not in scores:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[key] / average_length)
+                    value = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    if value > best.get(key, 0.0):
+                        best[key] = value
+            scores = best if scores is None else {key: scores[key] + value for key, value in best.items()}
+            if not scores:
+                return {}
+        return scores
+
+
+PRODUCTS.register_index("text", TextIndex(_product_fields, FIELD_WEIGHTS))
+
+
+def _query_terms(index, query):
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    # Type-ahead: the last word may still be incomplete
+    return [[token] for token in tokens[:-1]] + [index.expand_prefix(tokens[-1]) or [tokens[-1]]]
+
+
+def search_products(query, offset=0, limit=20, **filters):
+    """
+    Return `(results, total)` for a full-text query, best match first.
+
+    `results` is a list of `(key, product, score)` for one page and `total` is
+    the number of matching products. `filters` are the catalogue filters
+    (`tags`, `any_tags`, `customer_id`, `is_listed`).
+    """
+    scores = PRODUCTS.with_index("text", lambda index: index.score(_query_terms(index, query)))
+    if scores and filters:
+        allowed = _matching_keys(*_filters(**filters))
+        scores = {key: score for key, score in scores.items() if key in allowed}
+
+    ranked = heapq.nsmallest(offset + limit, scores.items(), key=lambda item: (-item[1], id_order(item[0])))
+    page = ranked[offset:]
+    records = PRODUCTS.get_many(key for key, _ in page)
+    results = [(key, records[key], score) for key, score in page if key in records]
+    return results, len(scores)
+
@@ -0,0 +1,172 @@
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+
+from .collection import Collection, DB_FOLDER
+
+SQLITE_PATH = os.path.join(DB_FOLDER, "cloop.sqlite3")
+
+# Record fields copied into their own indexed columns, per collection.
+# Every table also has `key` (primary key), `data` (the record as JSON),
+# `seq` (the mutation that last wrote it) and `deleted` (tombstone flag).
+INDEXED_FIELDS = {
+    "accounts": ("email", "role"),
+    "products": ("customer_id", "is_listed"),
+    "logs": ("user1", "user2"),
+    "orders": ("user_id",),
+    "reports": ("customerId", "reportedBy"),
+    "wishlist": (),
+    "ratings": (),
+    "tags": ("name",),
+    "feedback": ("user_id",),
+    "submissions": ("customerId",),
+    "revoked_tokens": (),
+    "blobs": (),
+    "sequences": (),
+    "image_jobs": (),
+    "events": (),
+    "webhook_events": (),
+}
+
+
+def connect(path=SQLITE_PATH):
+    """Open a connection in WAL mode so readers never block the writer."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS collections ("
+        " name TEXT PRIMARY KEY, seq INTEGER NOT NULL DEFAULT 0, purged INTEGER NOT NULL DEFAULT 0)"
+    )
+    return conn
+
+
+def _column_value(value):
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    return str(value)
+
+
+class SqliteCollection(Collection):
+    """
+    Collection stored as one table in `db/cloop.sqlite3`.
+
+    Each row keeps the full record as JSON next to indexed copies of the fields
+    in INDEXED_FIELDS. Deletes leave a tombstone row so other processes can
+    catch up by reading only rows with a newer `seq`; compaction purges them.
+    `PRAGMA data_version` tells us cheaply whether another connection wrote.
+    """
+
+    def __init__(self, name, path=SQLITE_PATH):
+        if not name.isidentifier():
+            raise ValueError(f"Invalid collection name '{name}'")
+        super().__init__(name)
+        self.path = path
+        self.fields = INDEXED_FIELDS.get(name, ())
+        self._conn = None
+        self._data_version = None
+        self._in_transaction = False
+        self._loaded = False
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._create_table()
+        return self._conn
+
+    def _create_table(self):
+        columns = "".join(f', "{field}" TEXT' for field in self.fields)
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.name}" ('
+            f" key TEXT PRIMARY KEY{columns}, data TEXT,"
+            " seq INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.name}_seq" ON "{self.name}" (seq)')
+        for field in self.fields:
+            self._conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "{self.name}_{field}" ON "{self.name}" ("{field}") WHERE deleted = 0'
+            )
+        self._conn.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (self.name,))
+
+    @contextmanager
+    def _transaction(self):
+        if self._in_transaction:
+            yield
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        self._in_transaction = True
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            # Our in-memory copy may hold writes that were rolled back
+            self._loaded = False
+            raise
+        else:
+            self.conn.execute("COMMIT")
+        finally:
+            self._in_transaction = False
+
+    def _refresh(self):
+        conn = self.conn
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._loaded and data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        seq, purged = conn.execute("SELECT seq, purged FROM collections WHERE name = ?", (self.name,)).fetchone()
+        if not self._loaded or purged > self._seq:
+            rows = conn.execute(f'SELECT key, data, seq FROM "{self.name}" WHERE deleted = 0')
+            self._data = {}
+            self._versions = {}
+            for key, data, row_seq in rows:
+                self._data[key] = json.loads(data)
+                self._versions[key] = row_seq
+            self._seq = seq
+            self._reindex()
+            self._loaded = True
+        elif seq > self._seq:
+            rows = conn.execute(
+                f'SELECT key, data, seq, deleted FROM "{self.name}" WHERE seq > ? ORDER BY seq', (self._seq,)
+            )
+            for key, data, row_seq, deleted in rows:
+                if deleted:
+                    self._apply({"op": "del", "key": key, "seq": row_seq})
+                else:
+                    self._apply({"op": "put", "key": key, "value": json.loads(data), "seq": row_seq})
+            self._seq = seq
+
+    def _persist(self, entry):
+        conn = self.conn
+        key, seq = entry["key"], entry["seq"]
+        if entry["op"] == "put":
+            record = entry["value"]
+            values = [_column_value(record.get(field)) if isinstance(record, dict) else None for field in self.fields]
+            columns = "".join(f', "{field}"' for field in self.fields)
+            placeholders = ", ?" * len(self.fields)
+            updates = "".join(f', "{field}" = excluded."{field}"' for field in self.fields)
+            conn.execute(
+                f'INSERT INTO "{self.name}" (key{columns}, data, seq, deleted) VALUES (?{placeholders}, ?, ?, 0)'
+                f" ON CONFLICT (key) DO UPDATE SET data = excluded.data, seq = excluded.seq, deleted = 0{updates}",
+                [key, *values, json.dumps(record, ensure_ascii=False), seq],
+            )
+        else:
+            conn.execute(f'UPDATE "{self.name}" SET data = NULL, deleted = 1, seq = ? WHERE key = ?', (seq, key))
+        conn.execute("UPDATE collections SET seq = ? WHERE name = ?", (seq, self.name))
+
+    def compact(self):
+        """Purge tombstones and checkpoint the WAL."""
+        with self._lock:
+            with self._transaction():
+                self._refresh()
+                if self._pending == 0:
+                    return False
+                self.conn.execute(f'DELETE FROM "{self.name}" WHERE deleted = 1')
+                self.conn.execute("UPDATE collections SET purged = seq WHERE name = ?", (self.name,))
+                self._pending = 0
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            return True
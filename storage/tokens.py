@@ -0,0 +1,38 @@
+"""
+Revoked access tokens.
+
+A revoked token's `jti` is kept until the token would have expired anyway,
+so the list stays as small as the number of live tokens that were revoked.
+Like every collection it is held in memory and follows other processes'
+writes through the journal, so checking a token is a dictionary lookup.
+Entries are indexed by the hour they expire in, so pruning only visits the
+hours that have passed and the entries it deletes.
+"""
+import time
+
+from .collection import get_collection
+
+REVOKED_TOKENS = get_collection("revoked_tokens")
+
+EXPIRY_BUCKET = 60 * 60  # Seconds of expiry times grouped under one index value
+
+REVOKED_TOKENS.add_index(
+    "expiry", lambda record: None if record.get("expires") is None else int(record["expires"] // EXPIRY_BUCKET)
+)
+
+
+def revoke_token(jti, expires):
+    """Revoke the token `jti` until `expires` (its `exp` claim), dropping entries that have expired."""
+    REVOKED_TOKENS.put(jti, {"expires": expires, "revoked": time.time()})
+
+    # Buckets before the current one hold only tokens that have expired
+    current = int(time.time() // EXPIRY_BUCKET)
+    expired = REVOKED_TOKENS.with_index("expiry", lambda index: [
+        key for bucket, keys in index.entries.items() if bucket < current for key in keys
+    ])
+    for key in expired:
+        REVOKED_TOKENS.delete(key)
+
+
+def is_revoked(jti):
+    return jti is not None and jti in REVOKED_TOKENS
@@ -0,0 +1,26 @@
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+import pytest
+
+# Point storage at a scratch database before anything imports it
+os.environ["CLOOP_DB_FOLDER"] = tempfile.mkdtemp(prefix="cloop-test-db-")
+atexit.register(shutil.rmtree, os.environ["CLOOP_DB_FOLDER"], True)
+os.environ.setdefault("CLOOP_STORAGE_BACKEND", "json")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from storage.journal import JsonCollection  # noqa: E402
+from storage.sqlite import SqliteCollection  # noqa: E402
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def make_collection(request, tmp_path):
+    """Return a factory opening collection `name` in a fresh folder, on each backend in turn."""
+    def make(name="items"):
+        if request.param == "json":
+            return JsonCollection(name, folder=str(tmp_path))
+        return SqliteCollection(name, path=str(tmp_path / "test.sqlite3"))
+    return make
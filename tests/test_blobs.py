@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import media.store as store
+from media.store import BLOBS, acquire, release, blob_path
+
+
+@pytest.fixture(autouse=True)
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "UPLOAD_FOLDER", str(tmp_path))
+    return tmp_path
+
+
+def _write_blob(name):
+    path = store._file(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(b"image bytes")
+    return path
+
+
+def test_acquire_reports_whether_the_file_exists():
+    name = "a1" + "0" * 62 + ".jpg"
+    assert acquire(name, "product:1") is False
+    path = _write_blob(name)
+    assert acquire(name, "product:2") is True
+    assert BLOBS.get(name) == {"path": blob_path(name), "owners": ["product:1", "product:2"]}
+    release("product:1")
+    release("product:2")
+    assert not os.path.exists(path)
+
+
+def test_blob_is_removed_with_its_last_owner():
+    name = "b2" + "0" * 62 + ".jpg"
+    path = _write_blob(name)
+    acquire(name, "product:1")
+    acquire(name, "product:1")  # Acquiring twice is one reference
+    acquire(name, "account:1")
+
+    release("product:1")
+    assert BLOBS.get(name)["owners"] == ["account:1"]
+    assert os.path.exists(path)
+
+    release("account:1", [name])
+    assert name not in BLOBS
+    assert not os.path.exists(path)
+    assert BLOBS.find_keys("owner", "account:1") == []
+
+
+def test_release_ignores_unknown_blobs():
+    release("product:9", ["c3" + "0" * 62 + ".jpg", None])
+    release("product:9")
@@ -0,0 +1,144 @@
+import pytest
+
+from storage import ConflictError, DELETE
+from storage.journal import JsonCollection
+
+
+def test_put_get_and_reopen(make_collection):
+    items = make_collection()
+    items.put(1, {"name": "shirt"})
+    items.put("2", {"name": "scarf"})
+
+    assert items.get("1") == {"name": "shirt"}
+    assert items.get(2) == {"name": "scarf"}
+    assert items.get("3") is None
+    assert sorted(items.keys()) == ["1", "2"]
+    assert make_collection().get("1") == {"name": "shirt"}
+
+
+def test_update(make_collection):
+    items = make_collection()
+    assert items.update("1", lambda count: count + 1, default=0) == 1
+    assert items.update("1", lambda count: count + 1, default=0) == 2
+    assert make_collection().get("1") == 2
+
+
+def test_update_can_delete(make_collection):
+    items = make_collection()
+    items.put("1", {"name": "shirt"})
+    assert items.update("1", lambda record: DELETE) is None
+    assert "1" not in items
+    # Deleting a missing record writes nothing
+    version = items.version
+    items.update("1", lambda record: DELETE)
+    assert items.version == version
+
+
+def test_update_refuses_none(make_collection):
+    items = make_collection()
+    items.put("1", {"name": "shirt"})
+    with pytest.raises(ValueError):
+        items.update("1", lambda record: None)
+    assert items.get("1") == {"name": "shirt"}
+
+
+def test_update_gets_a_copy(make_collection):
+    items = make_collection()
+    items.put("1", {"tags": ["a"]})
+
+    def change(record):
+        record["tags"].append("b")
+        raise RuntimeError("abandon the change")
+
+    with pytest.raises(RuntimeError):
+        items.update("1", change)
+    assert items.get("1") == {"tags": ["a"]}
+
+
+def test_delete(make_collection):
+    items = make_collection()
+    items.put("1", {"name": "shirt"})
+    assert items.delete("1") is True
+    assert items.delete("1") is False
+    assert make_collection().get("1") is None
+
+
+def test_versioned_writes_conflict(make_collection):
+    items = make_collection()
+    items.put("1", {"name": "shirt"})
+    record, version = items.get_versioned("1")
+
+    make_collection().put("1", {"name": "renamed"})
+    with pytest.raises(ConflictError):
+        items.put("1", {**record, "price": 5}, if_version=version)
+    with pytest.raises(ConflictError):
+        items.delete("1", if_version=version)
+
+    record, version = items.get_versioned("1")
+    items.put("1", {**record, "price": 5}, if_version=version)
+    assert items.get("1") == {"name": "renamed", "price": 5}
+
+
+def test_unique_index(make_collection):
+    items = make_collection()
+    items.add_index("email", lambda record: record.get("email"), unique=True)
+    items.put("1", {"email": "a@example.com"})
+
+    with pytest.raises(ConflictError):
+        items.put("2", {"email": "a@example.com"})
+    assert "2" not in items
+
+    # A record may keep its own value, and a freed value can be taken
+    items.put("1", {"email": "a@example.com", "name": "Ann"})
+    items.put("1", {"email": "b@example.com"})
+    items.put("2", {"email": "a@example.com"})
+    assert items.find_keys("email", "a@example.com") == ["2"]
+
+
+def test_multi_index_follows_writes(make_collection):
+    items = make_collection()
+    items.add_index("tag", lambda record: record["tags"], multi=True)
+    items.put("1", {"tags": ["red", "wool"]})
+    items.put("2", {"tags": ["red"]})
+
+    assert sorted(items.find_keys("tag", "red")) == ["1", "2"]
+    items.update("1", lambda record: {**record, "tags": ["wool"]})
+    items.delete("2")
+    assert items.find_keys("tag", "red") == []
+    assert items.find_keys("tag", "wool") == ["1"]
+
+
+def test_writes_from_another_instance_are_seen(make_collection):
+    first, second = make_collection(), make_collection()
+    first.get("1")
+    second.put("1", {"name": "shirt"})
+    assert first.get("1") == {"name": "shirt"}
+
+
+def test_journal_replay_ignores_and_repairs_a_torn_line(tmp_path):
+    items = JsonCollection("items", folder=str(tmp_path))
+    items.put("1", {"name": "shirt"})
+    items.put("2", {"name": "scarf"})
+    with open(items.journal_path, "ab") as file:
+        file.write(b'{"op": "put", "key": "3", "rec')  # A write cut short by a crash
+
+    reopened = JsonCollection("items", folder=str(tmp_path))
+    assert sorted(reopened.keys()) == ["1", "2"]
+
+    # The next writer truncates the torn line before appending
+    reopened.put("4", {"name": "hat"})
+    with open(items.journal_path, "rb") as file:
+        assert file.read().endswith(b"}\n")
+    assert sorted(JsonCollection("items", folder=str(tmp_path)).keys()) == ["1", "2", "4"]
+
+
+def test_compact_keeps_records(tmp_path):
+    items = JsonCollection("items", folder=str(tmp_path))
+    items.put("1", {"name": "shirt"})
+    items.delete("1")
+    items.put("2", {"name": "scarf"})
+    assert items.compact() is True
+
+    reopened = JsonCollection("items", folder=str(tmp_path))
+    assert dict(reopened.items()) == {"2": {"name": "scarf"}}
+    assert reopened.version == items.version
@@ -0,0 +1,30 @@
+import multiprocessing
+
+from storage import get_collection
+from storage.ids import next_id, id_order
+
+
+def _allocate(args):
+    name, count = args
+    collection = get_collection(name)
+    return [next_id(collection) for _ in range(count)]
+
+
+def test_next_id_starts_after_existing_keys():
+    widgets = get_collection("widgets_existing")
+    widgets.put("7", {})
+    widgets.put("draft", {})
+    assert next_id(widgets) == "8"
+    assert next_id(widgets) == "9"
+
+
+def test_next_id_is_unique_across_processes():
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        batches = pool.map(_allocate, [("widgets_shared", 25)] * 4)
+    ids = [id for batch in batches for id in batch]
+    assert len(set(ids)) == 100
+    assert sorted(ids, key=id_order) == [str(n) for n in range(1, 101)]
+
+
+def test_id_order():
+    assert sorted(["10", "draft", "9", "100"], key=id_order) == ["9", "10", "100", "draft"]
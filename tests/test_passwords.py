@@ -0,0 +1,65 @@
+from concurrent.futures import Future
+
+import pytest
+
+import services.passwords as passwords
+from storage.accounts import ACCOUNTS
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch):
+    """Hash at the lowest cost, and run hashes inline so their callbacks finish before rehash_later returns."""
+    def submit(func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(passwords, "_submit", submit)
+
+
+def _account(account_id, password):
+    hashed = passwords._hash(password, 5)
+    ACCOUNTS.put(account_id, {"username": f"user{account_id}", "password": hashed})
+    return hashed
+
+
+def test_rehash_upgrades_an_outdated_hash():
+    hashed = _account("101", "secret")
+    assert passwords.needs_rehash(hashed)
+
+    assert passwords.verify_login("101", ACCOUNTS.get("101"), "secret")
+    new_hash = ACCOUNTS.get("101")["password"]
+    assert new_hash != hashed
+    assert not passwords.needs_rehash(new_hash)
+    assert passwords.check_password(new_hash, "secret")
+
+
+def test_rehash_leaves_a_changed_password_alone():
+    hashed = _account("102", "secret")
+    changed = passwords._hash("other", 4)
+    ACCOUNTS.update("102", lambda account: {**account, "password": changed})
+
+    passwords.rehash_later("102", hashed, "secret")
+    assert ACCOUNTS.get("102")["password"] == changed
+
+
+def test_rehash_does_not_resurrect_an_account_deleted_meanwhile(monkeypatch, capsys):
+    hashed = _account("103", "secret")
+
+    class DeletedAfterCheck:
+        """Accounts whose record is deleted right after rehash_later has looked at it."""
+
+        def get(self, key):
+            account = ACCOUNTS.get(key)
+            ACCOUNTS.delete(key)
+            return account
+
+        def update(self, key, change):
+            return ACCOUNTS.update(key, change)
+
+    monkeypatch.setattr(passwords, "ACCOUNTS", DeletedAfterCheck())
+    passwords.rehash_later("103", hashed, "secret")
+
+    assert ACCOUNTS.get("103") is None
+    assert "Could not upgrade" not in capsys.readouterr().out
@@ -0,0 +1,48 @@
+import pytest
+
+from storage.products import PRODUCTS, tag_query, cart_total, purchasable
+
+
+@pytest.fixture(scope="module", autouse=True)
+def products():
+    PRODUCTS.put("1", {"name": "Shirt", "tags": ["Men", "Tops"], "price": 12.5})
+    PRODUCTS.put("2", {"name": "Blouse", "tags": ["Women", "Tops"], "price": 20})
+    PRODUCTS.put("10", {"name": "Jeans", "tags": ["Men", " Bottoms "]})
+    PRODUCTS.put("11", {"name": "Skirt", "tags": ["Women", "Bottoms"], "price": 15, "is_listed": False})
+    yield
+    for key in ("1", "2", "10", "11"):
+        PRODUCTS.delete(key)
+
+
+def test_tag_query_and():
+    assert tag_query(["Tops"]) == ["1", "2"]
+    assert tag_query(["Men", "Tops"]) == ["1"]
+    assert tag_query(["Men", "Women"]) == []
+    assert tag_query(["Unknown"]) == []
+
+
+def test_tag_query_or():
+    assert tag_query(any_tags=["Bottoms", "Tops"]) == ["1", "2", "10", "11"]
+    assert tag_query(any_tags=["Bottoms", "Unknown"]) == ["10", "11"]
+
+
+def test_tag_query_and_with_or():
+    assert tag_query(["Women"], ["Tops", "Bottoms"]) == ["2", "11"]
+    assert tag_query(["Men"], ["Bottoms"]) == ["10"]
+
+
+def test_tag_query_without_tags_returns_every_product():
+    assert tag_query() == ["1", "2", "10", "11"]
+
+
+def test_tag_query_follows_updates():
+    assert tag_query(["Tops"]) == ["1", "2"]
+    PRODUCTS.update("2", lambda product: {**product, "tags": ["Women"]})
+    assert tag_query(["Tops"]) == ["1"]
+    PRODUCTS.update("2", lambda product: {**product, "tags": ["Women", "Tops"]})
+
+
+def test_cart_total_counts_only_purchasable_products():
+    products = [PRODUCTS.get(key) for key in ("1", "1", "2", "10", "11")]
+    assert [purchasable(product) for product in products] == [True, True, True, False, False]
+    assert cart_total(products) == 45.0
@@ -8,6 +8,9 @@ from .accounts import user_accounts_bp
 from .submission import user_submissions_bp
 from .checkout import user_checkout_bp
 from .reports import user_reports_bp
+from .jobs import user_jobs_bp
+from .events import user_events_bp
+from .orders import user_orders_bp
 
 user_bp = Blueprint("user", __name__, url_prefix="/api/user")
 
@@ -19,7 +22,10 @@ user_blueprints = [
     user_accounts_bp,
     user_submissions_bp,
     user_checkout_bp,
-    user_reports_bp
+    user_reports_bp,
+    user_jobs_bp,
+    user_events_bp,
+    user_orders_bp
 ]
  
 for bp in user_blueprints:
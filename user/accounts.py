@@ -1,38 +1,28 @@
 import os
-import json
 import datetime
 import uuid
 from flask import Blueprint, jsonify, request
-from flask_bcrypt import Bcrypt
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
-from PIL import Image
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
+from storage import ConflictError
+from storage.accounts import ACCOUNTS, find_by_email, is_disabled
+from storage.ids import next_id
+from services.auth import revoke
+from services.passwords import hash_password, check_password, verify_login, PasswordBusyError
+from media import store_image, release, blob_name, QueueFullError, UploadRejectedError
 
 user_accounts_bp = Blueprint("user_accounts", __name__)
-bcrypt = Bcrypt()
-
-# Database path (fixed to ../db)
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
 
 # Upload folder
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "../api/uploads")
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+MAX_PFP_WIDTH = 800
 
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to a file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
+def allowed_file(filename):
+    """Check if uploaded file is an allowed image format."""
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @user_accounts_bp.route("/auth/register", methods=['POST'])
 def create_account():
@@ -44,15 +34,15 @@ def create_account():
     if not name or not email or not password:
         return jsonify({"error": "All fields are required"}), 400
 
-    accounts = load_json(DB_PATH_ACCOUNTS)
-
-    for account in accounts.values():
-        if account["email"] == email:
-            return jsonify({"error": "Email already in use"}), 400
+    if find_by_email(email):
+        return jsonify({"error": "Email already in use"}), 400
 
-    account_id = str(len(accounts) + 1)
+    try:
+        hashed_password = hash_password(password)
+    except PasswordBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    account_id = next_id(ACCOUNTS)
 
     new_account = {
         "id": account_id,
@@ -66,8 +56,10 @@ def create_account():
         "disabled_until": None,
     }
 
-    accounts[account_id] = new_account
-    save_json(DB_PATH_ACCOUNTS, accounts)
+    try:
+        ACCOUNTS.put(account_id, new_account)
+    except ConflictError:
+        return jsonify({"error": "Email already in use"}), 400
 
     return jsonify({"message": "Account created successfully!"}), 201
 
@@ -80,20 +72,31 @@ def login():
     if not email or not password:
         return jsonify({"error": "Missing email or password"}), 400
 
-    accounts = load_json(DB_PATH_ACCOUNTS)
-
-    user = next((user for user in accounts.values() if user["email"] == email), None)
+    user = find_by_email(email)
 
     if not user:
         return jsonify({"error": "Invalid email or password"}), 401
 
-    if not bcrypt.check_password_hash(user["password"], password):
-        return jsonify({"error": "Invalid email or password"}), 401
+    try:
+        if not verify_login(str(user["id"]), user, password):
+            return jsonify({"error": "Invalid email or password"}), 401
+    except PasswordBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+    if is_disabled(user):
+        return jsonify({"error": "Account is disabled"}), 403
 
     token = create_access_token(identity={"id": user["id"], "role": "user"}, expires_delta=datetime.timedelta(hours=24))
 
     return jsonify({"token": token}), 200
 
+@user_accounts_bp.route("/auth/logout", methods=["POST"])
+@jwt_required()
+def logout():
+    """Revoke the token used for this request."""
+    revoke(get_jwt())
+    return jsonify({"message": "Logged out"}), 200
+
 @user_accounts_bp.route("/profile/<int:user_id>", methods=["GET"])
 @jwt_required()
 def get_user_profile(user_id):
@@ -101,19 +104,19 @@ def get_user_profile(user_id):
     user_id = str(user_id)
     user_identity = get_jwt_identity()
 
-    accounts = load_json(DB_PATH_ACCOUNTS)
-
-    if user_id not in accounts:
+    if user_id not in ACCOUNTS:
         return jsonify({"error": f"User {user_id} not found."}), 404
 
-    user_data = accounts[user_id]
-    user_data.pop("password", None)
+    user_data = {key: value for key, value in ACCOUNTS.get(user_id).items() if key != "password"}
 
     return jsonify({"profile": user_data}), 200
 
 @user_accounts_bp.route("/profile/<int:user_id>/upload", methods=["POST"])
 def upload_profile_picture(user_id):
-    """Upload and compress a profile picture before saving."""
+    """
+    Upload a profile picture. It is compressed in the background and set on
+    the account when done; poll `/api/user/jobs/<job_id>` for the outcome.
+    """
     if "file" not in request.files:
         return jsonify({"error": "No file provided"}), 400
 
@@ -122,30 +125,38 @@ def upload_profile_picture(user_id):
     if file.filename == "" or not allowed_file(file.filename):
         return jsonify({"error": "Invalid file type"}), 400
 
-    filename = secure_filename(f"user_{user_id}.jpg")
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-
     try:
-        image = Image.open(file)
-        image = image.convert("RGB")
+        user_id = str(user_id)
+        owner = f"account:{user_id}"
 
-        max_width = 800
-        if image.width > max_width:
-            height = int((max_width / image.width) * image.height)
-            image = image.resize((max_width, height), Image.LANCZOS)
+        if user_id not in ACCOUNTS:
+            return jsonify({"error": "User not found"}), 404
 
-        image.save(filepath, format="JPEG", quality=85, optimize=True)
+        def set_pfp(filename):
+            previous = []
 
-        accounts = load_json(DB_PATH_ACCOUNTS)
-        user_id = str(user_id)
+            def change(account):
+                if account is None:
+                    raise LookupError(f"User {user_id} no longer exists")
+                previous.append(account.get("pfp"))
+                return {**account, "pfp": filename}
 
-        if user_id not in accounts:
-            return jsonify({"error": "User not found"}), 404
+            # On failure store_image releases the new picture
+            ACCOUNTS.update(user_id, change)
+            # Drop the picture this one replaces
+            if previous[0] != filename:
+                release(owner, [blob_name(previous[0])])
 
-        accounts[user_id]["pfp"] = filename
-        save_json(DB_PATH_ACCOUNTS, accounts)
+        try:
+            filename, job_id = store_image(file, owner, MAX_PFP_WIDTH, on_done=set_pfp)
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 503
+        except UploadRejectedError as e:
+            return jsonify({"error": str(e)}), e.status
 
-        return jsonify({"message": "Profile picture updated successfully!", "filename": filename}), 200
+        if job_id is None:
+            return jsonify({"message": "Profile picture updated successfully!", "filename": filename}), 200
+        return jsonify({"message": "Profile picture is being processed.", "filename": filename, "job_id": job_id}), 202
 
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -156,12 +167,12 @@ def update_user_profile(user_id):
     data = request.json
     user_id = str(user_id)
 
-    accounts = load_json(DB_PATH_ACCOUNTS)
+    user_data = ACCOUNTS.get(user_id)
 
-    if user_id not in accounts:
+    if user_data is None:
         return jsonify({"error": "User not found"}), 404
 
-    user_data = accounts[user_id]
+    user_data = dict(user_data)
 
     if "username" in data:
         user_data["username"] = data["username"].strip()
@@ -172,22 +183,19 @@ def update_user_profile(user_id):
     if "bio" in data:
         user_data["bio"] = data["bio"].strip()
 
-    accounts[user_id] = user_data
-    save_json(DB_PATH_ACCOUNTS, accounts)
+    try:
+        ACCOUNTS.put(user_id, user_data)
+    except ConflictError:
+        return jsonify({"error": "Email already in use"}), 400
 
     return jsonify({"message": "Profile updated successfully!"}), 200
 
 @user_accounts_bp.route("/auth/verify/<token>", methods=["GET"])
 def verify_email(token):
     """Verify user email using a token."""
-    accounts = load_json(DB_PATH_ACCOUNTS)
-
-    for user_id, user in accounts.items():
+    for user_id, user in ACCOUNTS.items():
         if user.get("verification_token") == token:
-            user["status"] = "active"
-            user["verification_token"] = None
-            accounts[user_id] = user
-            save_json(DB_PATH_ACCOUNTS, accounts)
+            ACCOUNTS.put(user_id, {**user, "status": "active", "verification_token": None})
             return jsonify({"message": "Account verified successfully!"}), 200
 
     return jsonify({"error": "Invalid or expired verification link."}), 400
@@ -207,18 +215,27 @@ def change_password(user_id):
     if str(user_identity["id"]) != str(user_id):
         return jsonify({"error": "Unauthorized action."}), 403
 
-    accounts = load_json(DB_PATH_ACCOUNTS)
+    user = ACCOUNTS.get(user_id)
 
-    if str(user_id) not in accounts:
+    if user is None:
         return jsonify({"error": "User not found"}), 404
 
-    user = accounts[str(user_id)]
+    try:
+        if not check_password(user["password"], current_password):
+            return jsonify({"error": "Incorrect current password."}), 401
+
+        new_hash = hash_password(new_password)
+    except PasswordBusyError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
 
-    if not bcrypt.check_password_hash(user["password"], current_password):
-        return jsonify({"error": "Incorrect current password."}), 401
+    def change(account):
+        if account is None:
+            raise LookupError(user_id)
+        return {**account, "password": new_hash}
 
-    user["password"] = bcrypt.generate_password_hash(new_password).decode("utf-8")
-    accounts[str(user_id)] = user
-    save_json(DB_PATH_ACCOUNTS, accounts)
+    try:
+        ACCOUNTS.update(user_id, change)
+    except LookupError:
+        return jsonify({"error": "User not found"}), 404
 
     return jsonify({"message": "Password updated successfully!"}), 200
\ No newline at end of file
@@ -1,20 +1,20 @@
 import stripe
 from flask import Blueprint, jsonify, request
-import os
-import shelve
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from storage.products import get_products, cart_total, purchasable
+from services import payments
+from services.payments import CheckoutError
+from services.webhooks import verify_event, enqueue, WebhookError
 
 user_checkout_bp = Blueprint("checkout", __name__)
 
-stripe.api_key = "sk_test_51QtAEpFQvhgt2WZEVLCpAg6NNsTqKY4zesjYyEhFhvJ5ZE43E95X41Z3TgtroIc7IT5xyfxjkM14QkMxjtXcn7TE00E8O4aTv8"
-
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_ORDERS = os.path.join(DB_FOLDER, "orders")
-DB_PATH_PRODUCTS = os.path.join(DB_FOLDER, "products")
-
 @user_checkout_bp.route("/cart/products", methods=["POST"])
 def get_cart_products():
-    """Fetch product details based on product IDs."""
+    """
+    Fetch the cart's products from the product store in one batch, with the
+    total price of those that can be checked out. Products that are unlisted or
+    have no price are listed under `unavailable`, since checkout refuses them.
+    """
     try:
         data = request.json
         product_ids = data.get("product_ids", [])
@@ -22,40 +22,60 @@ def get_cart_products():
         if not product_ids:
             return jsonify({"error": "No products in cart"}), 400
 
-        with shelve.open(DB_PATH_PRODUCTS) as db:
-            products = [db[str(pid)] for pid in product_ids if str(pid) in db]
-            total_price = sum(product["price"] for product in products)
+        products = get_products(product_ids)
+        total_price = cart_total(products)
+        unavailable = [str(product["id"]) for product in products if not purchasable(product)]
 
-        return jsonify({"products": products, "total_price": total_price}), 200
+        return jsonify({"products": products, "total_price": total_price, "unavailable": unavailable}), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 
 @user_checkout_bp.route("/checkout", methods=["POST"])
+@jwt_required(optional=True)
 def create_checkout_session():
+    """
+    Create a Stripe Checkout session for the cart.
+
+    Expects `{"items": [{"id": <product id>, "quantity": 1}, ...]}`; prices
+    come from the product store. Send an `Idempotency-Key` header to make
+    retrying the request safe. When logged in, the order is added to the
+    user's history once Stripe reports the payment.
+    """
     try:
-        data = request.json
-        line_items = [
-            {
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {"name": item["name"]},
-                    "unit_amount": int(item["price"] * 100),  # Convert dollars to cents
-                },
-                "quantity": 1,
-            }
-            for item in data["items"]
-        ]
-
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=line_items,
-            mode="payment",
-            success_url="http://localhost:3000/success",
-            cancel_url="http://localhost:3000/cart",
+        data = request.get_json(silent=True) or {}
+        items = data.get("items")
+        if not isinstance(items, list):
+            return jsonify({"error": "'items' must be a list"}), 400
+
+        identity = get_jwt_identity()
+        session = payments.create_checkout_session(
+            items,
+            client_key=request.headers.get("Idempotency-Key"),
+            user_id=identity.get("id") if identity else None,
         )
+        return jsonify({"sessionId": session.id, "url": session.url}), 200
 
-        return jsonify({"sessionId": session.id})
+    except CheckoutError as e:
+        return jsonify({"error": str(e)}), 400
+    except stripe.StripeError as e:
+        print(f"❌ Stripe checkout failed: {e}")
+        return jsonify({"error": "Payment provider is unavailable, please try again"}), 502
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@user_checkout_bp.route("/checkout/webhook", methods=["POST"])
+def stripe_webhook():
+    """
+    Receive Stripe events. They are queued durably and applied by the
+    webhook worker, so this only verifies the signature and stores the event.
+    """
+    try:
+        event = verify_event(request.get_data(), request.headers.get("Stripe-Signature"))
+        enqueue(event)
+        return jsonify({"received": True}), 200
 
+    except WebhookError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
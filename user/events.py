@@ -0,0 +1,77 @@
+from flask import Blueprint, Response
+import json
+import time
+import asyncio
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services import subscribe
+
+user_events_bp = Blueprint("user_events", __name__)
+
+# Streams end after this many seconds; EventSource reconnects on its own
+STREAM_TIMEOUT = 5 * 60
+KEEPALIVE_INTERVAL = 15
+RECONNECT_DELAY_MS = 3000
+
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Let nginx pass events through as they come
+}
+
+def format_event(event):
+    """Encode one pubsub event as a Server-Sent Events frame."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@user_events_bp.route("/events", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"])  # EventSource cannot set headers: `?jwt=<token>`
+def stream_events():
+    """
+    Server-Sent Events stream of the logged-in user's new chat messages
+    ("message") and swap requests ("swap_request").
+
+    A "resync" event means events were dropped; reload the chats and
+    catch up with `GET /chats/<user2>?after=<timestamp>`.
+
+    This view holds a worker thread per stream. Under `asgi.py` the same
+    stream is served by `stream_events_async` instead.
+    """
+    user_id = str(get_jwt_identity().get("id"))
+    subscription = subscribe(f"user:{user_id}")
+
+    def generate():
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+            deadline = time.time() + STREAM_TIMEOUT
+            while time.time() < deadline:
+                event = subscription.get(timeout=KEEPALIVE_INTERVAL)
+                if subscription.overflowed:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype="text/event-stream", headers=STREAM_HEADERS)
+
+async def stream_events_async(user_id):
+    """
+    Async generator of the same frames as `stream_events`, for the ASGI
+    server. Waiting for events costs a coroutine instead of a thread.
+    """
+    subscription = subscribe(f"user:{user_id}", loop=asyncio.get_running_loop())
+    try:
+        yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+        deadline = time.time() + STREAM_TIMEOUT
+        while time.time() < deadline:
+            event = await subscription.get(timeout=KEEPALIVE_INTERVAL)
+            if subscription.overflowed:
+                yield "event: resync\ndata: {}\n\n"
+                return
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        subscription.close()
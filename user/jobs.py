@@ -0,0 +1,21 @@
+from flask import Blueprint, jsonify
+from media import get_job
+
+user_jobs_bp = Blueprint("user_jobs", __name__)
+
+@user_jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    """
+    Report the status of a background image job: "queued", "done" (with
+    `result`) or "failed" (with `error`).
+    """
+    try:
+        job = get_job(job_id)
+
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+
+        return jsonify({"job": job}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
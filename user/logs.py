@@ -1,54 +1,45 @@
 from flask import Blueprint, request, jsonify
-import os
-import json
 import time
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from storage.accounts import usernames
+from storage.chats import find_chat, user_chats, get_chat, get_messages, add_messages, create_chat
+from services import publish
 
 user_logs_bp = Blueprint("user_logs", __name__)
 
-# Database paths
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_LOGS = os.path.join(DB_FOLDER, "logs.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to a file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
-
-def get_username(user_id):
-    """Fetch username from accounts database."""
-    accounts_db = load_json(DB_PATH_ACCOUNTS)
-    return accounts_db.get(str(user_id), {}).get("username", f"User {user_id}")
+def push_messages(chat_key, sender, recipient, *messages, event_type="message", **fields):
+    """Push newly stored messages to both participants' event streams."""
+    for message in messages:
+        event = {"type": event_type, "chat_id": chat_key, "from": str(sender), "to": str(recipient),
+                 "message": message, **fields}
+        for user_id in {str(sender), str(recipient)}:
+            publish(f"user:{user_id}", event)
 
 @user_logs_bp.route("/chats", methods=["GET"])
 @jwt_required()  # Ensure user is logged in
 def get_chats():
-    """Fetch all chats for the logged-in user."""
+    """Fetch the logged-in user's chats with only the last message of each."""
     try:
         user_id = str(get_jwt_identity().get("id"))  # Extract user ID from JWT
-        logs_db = load_json(DB_PATH_LOGS)
-        user_chats = {}
-
-        for chat_id, log in logs_db.items():
-            if str(log["user1"]) == user_id or str(log["user2"]) == user_id:
-                other_user_id = str(log["user2"]) if str(log["user1"]) == user_id else str(log["user1"])
-                other_username = get_username(other_user_id)
-
-                user_chats[other_user_id] = {
-                    "user_id": other_user_id,
-                    "username": other_username,
-                    "logs": sorted(log["logs"], key=lambda x: x["timestamp"])
-                }
+        chats = {}
+
+        logs = [get_chat(chat_id) for chat_id, log in user_chats(user_id)]
+        other_user_ids = [str(log["user2"]) if str(log["user1"]) == user_id else str(log["user1"]) for log in logs]
+        names = usernames(other_user_ids)
+
+        for log, other_user_id in zip(logs, other_user_ids):
+            other_username = names.get(other_user_id, f"User {other_user_id}")
+            last_message = log.get("last_message")
+
+            chats[other_user_id] = {
+                "user_id": other_user_id,
+                "username": other_username,
+                "message_count": log.get("message_count", 0),
+                "last_message": last_message,
+                "logs": [last_message] if last_message else []
+            }
 
-        return jsonify({"chats": user_chats}), 200
+        return jsonify({"chats": chats}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -56,20 +47,28 @@ def get_chats():
 @user_logs_bp.route("/chats/<int:user2>", methods=["GET", "POST"])
 @jwt_required()
 def chat_logs(user2):
-    """Fetch messages or send messages in chat."""
+    """
+    Fetch messages or send messages in chat.
+
+    GET accepts `before`/`after` timestamps and `limit` to page through the
+    history; without them the whole conversation is returned.
+    """
     try:
         user1 = str(get_jwt_identity().get("id"))
-        logs_db = load_json(DB_PATH_LOGS)
 
         if request.method == "GET":
-            chat_key = next((key for key, log in logs_db.items() if {str(log["user1"]), str(log["user2"])} == {user1, str(user2)}), None)
+            chat_key = find_chat(user1, user2)
 
             if not chat_key:
-                return jsonify({"logs": []}), 200  # No messages found
+                return jsonify({"logs": [], "has_more": False}), 200  # No messages found
 
-            logs = logs_db[chat_key]["logs"]
-            logs.sort(key=lambda x: x["timestamp"])
-            return jsonify({"logs": logs}), 200
+            logs, has_more = get_messages(
+                chat_key,
+                before=request.args.get("before", type=float),
+                after=request.args.get("after", type=float),
+                limit=request.args.get("limit", type=int),
+            )
+            return jsonify({"logs": logs, "has_more": has_more}), 200
 
         elif request.method == "POST":
             data = request.json
@@ -78,7 +77,7 @@ def chat_logs(user2):
             if not message:
                 return jsonify({"error": "Message is required"}), 400
 
-            chat_key = next((key for key, log in logs_db.items() if {str(log["user1"]), str(log["user2"])} == {user1, str(user2)}), None)
+            chat_key = find_chat(user1, user2)
 
             new_message = {
                 "user": user1,
@@ -87,12 +86,10 @@ def chat_logs(user2):
             }
 
             if chat_key:
-                logs_db[chat_key]["logs"].append(new_message)
+                stored = add_messages(chat_key, new_message)
             else:
-                chat_key = str(len(logs_db) + 1)
-                logs_db[chat_key] = {"user1": user1, "user2": str(user2), "logs": [new_message]}
-
-            save_json(DB_PATH_LOGS, logs_db)
+                chat_key, stored = create_chat(user1, user2, new_message)
+            push_messages(chat_key, user1, user2, *stored)
             return jsonify({"message": "Message sent successfully"}), 200
 
     except Exception as e:
@@ -104,21 +101,15 @@ def start_chat(user2):
     """Create a new chat between logged-in user and another user."""
     try:
         user1 = str(get_jwt_identity().get("id"))
-        logs_db = load_json(DB_PATH_LOGS)
 
-        chat_key = next((key for key, chat in logs_db.items() if {str(chat["user1"]), str(chat["user2"])} == {user1, str(user2)}), None)
+        chat_key = find_chat(user1, user2)
 
         if chat_key:
             return jsonify({"message": "Chat already exists", "chat_id": chat_key}), 200
 
-        new_chat_id = str(len(logs_db) + 1)
-        logs_db[new_chat_id] = {
-            "user1": user1,
-            "user2": str(user2),
-            "logs": [{"user": user1, "timestamp": time.time(), "message": "Chat started"}]
-        }
-
-        save_json(DB_PATH_LOGS, logs_db)
+        first_message = {"user": user1, "timestamp": time.time(), "message": "Chat started"}
+        new_chat_id, stored = create_chat(user1, user2, first_message)
+        push_messages(new_chat_id, user1, user2, *stored)
         return jsonify({"message": "Chat created", "chat_id": new_chat_id}), 201
 
     except Exception as e:
@@ -130,28 +121,21 @@ def request_swap(product_id, user2):
     """Create a new chat (if not exists) and send a swap request message."""
     try:
         user1 = str(get_jwt_identity().get("id"))
-        logs_db = load_json(DB_PATH_LOGS)
 
-        chat_key = next((key for key, log in logs_db.items() if {str(log["user1"]), str(log["user2"])} == {user1, str(user2)}), None)
+        chat_key = find_chat(user1, user2)
+        swap_message = {
+            "user": user1,
+            "timestamp": time.time(),
+            "message": f"🔄 Swap request for product {product_id}."
+        }
 
         if chat_key:
-            logs_db[chat_key]["logs"].append({
-                "user": user1,
-                "timestamp": time.time(),
-                "message": f"🔄 Swap request for product {product_id}."
-            })
+            stored = add_messages(chat_key, swap_message)
         else:
-            chat_key = str(len(logs_db) + 1)
-            logs_db[chat_key] = {
-                "user1": user1,
-                "user2": str(user2),
-                "logs": [
-                    {"user": user1, "timestamp": time.time(), "message": "Chat started"},
-                    {"user": user1, "timestamp": time.time(), "message": f"🔄 Swap request for product {product_id}."}
-                ],
-            }
-
-        save_json(DB_PATH_LOGS, logs_db)
+            first_message = {"user": user1, "timestamp": swap_message["timestamp"], "message": "Chat started"}
+            chat_key, stored = create_chat(user1, user2, first_message, swap_message)
+            push_messages(chat_key, user1, user2, *stored[:-1])
+        push_messages(chat_key, user1, user2, stored[-1], event_type="swap_request", product_id=product_id)
         return jsonify({"message": "Swap request sent!", "chat_id": chat_key}), 201
 
     except Exception as e:
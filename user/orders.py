@@ -0,0 +1,31 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from storage.orders import list_orders, DEFAULT_PAGE_SIZE
+from storage.products import parse_page
+
+user_orders_bp = Blueprint("user_orders", __name__)
+
+@user_orders_bp.route("/orders", methods=["GET"])
+@jwt_required()
+def get_order_history():
+    """
+    The logged-in user's orders, newest first.
+
+    `limit` sets the page size; pass the returned `next_cursor` as `cursor`
+    for the next page.
+    """
+    try:
+        user_id = str(get_jwt_identity().get("id"))
+
+        try:
+            limit = parse_page(request.args, default_limit=DEFAULT_PAGE_SIZE)["limit"]
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        page, next_cursor = list_orders(user_id, cursor=request.args.get("cursor"), limit=limit)
+        orders = [{**order, "id": order_id} for order_id, order in page]
+
+        return jsonify({"orders": orders, "next_cursor": next_cursor}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
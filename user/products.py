@@ -1,63 +1,98 @@
 from flask import Blueprint, jsonify, request
-import os
-import json
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from storage import get_collection, ConflictError
+from storage.accounts import usernames
+from storage.products import PRODUCTS, list_products, parse_query, parse_filters, parse_page
+from storage.search import search_products
+from services import cached_response
 
 user_products_bp = Blueprint("user_products", __name__)
 
-# Database paths
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_PRODUCTS = os.path.join(DB_FOLDER, "products.json")
-DB_PATH_WISHLIST = os.path.join(DB_FOLDER, "wishlist.json")
-DB_PATH_ACCOUNTS = os.path.join(DB_FOLDER, "accounts.json")
-
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to a file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
-
-def get_username(user_id):
-    """Fetch username from accounts database."""
-    accounts_db = load_json(DB_PATH_ACCOUNTS)
-    return accounts_db.get(str(user_id), {}).get("username", f"User {user_id}")
+WISHLIST = get_collection("wishlist")
+
+SEARCH_PAGE_SIZE = 20
+
+def with_seller_usernames(products):
+    """Add `seller_username` to copies of the given products, looking sellers up in one batch."""
+    names = usernames(product.get("customer_id") for product in products)
+    return [
+        {**product, "seller_username": names.get(str(product.get("customer_id")), f"User {product.get('customer_id')}")}
+        for product in products
+    ]
 
 @user_products_bp.route("/products", methods=["GET"])
+@cached_response("products", "accounts")
 def get_products():
-    """Fetch all products from the database in numerical order, including seller usernames."""
+    """
+    Fetch listed products, including seller usernames.
+
+    Accepts `sort`, `tags` (all of), `any_tags` (one of), `customer_id`,
+    `limit` and `cursor`/`offset`.
+    Without `limit` every matching product is returned; with it the response
+    also carries `next_cursor` for the following page.
+    """
     try:
-        products_db = load_json(DB_PATH_PRODUCTS)
-        products = []
+        try:
+            query = parse_query(request.args)
+            query["is_listed"] = True  # Exclude delisted products
+            page, next_cursor = list_products(**query)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        response = {"products": with_seller_usernames([product for key, product in page])}
+        if "limit" in query:
+            response["next_cursor"] = next_cursor
+        return jsonify(response), 200
 
-        for key in sorted(products_db.keys(), key=int):
-            product = products_db[key]
-            product["seller_username"] = get_username(product["customer_id"])  # Fetch username
-            if product.get("is_listed", True):  # Exclude delisted products
-                products.append(product)
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@user_products_bp.route("/products/search", methods=["GET"])
+@cached_response("products", "accounts")
+def search_products_route():
+    """
+    Full-text search over listed products' names, descriptions and tags.
+
+    `q` is the query (its last word also matches as a prefix), `limit` and
+    `offset` page through the results, best match first. Accepts the same
+    `tags`, `any_tags` and `customer_id` filters as the catalogue.
+    """
+    try:
+        query = request.args.get("q", "").strip()
+        if not query:
+            return jsonify({"error": "Missing search query"}), 400
 
-        return jsonify({"products": products}), 200
+        try:
+            filters = parse_filters(request.args)
+            page = parse_page(request.args, default_limit=SEARCH_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        filters["is_listed"] = True  # Exclude delisted products
+        offset, limit = page.get("offset", 0), page["limit"]
+
+        results, total = search_products(query, offset=offset, limit=limit, **filters)
+        products = with_seller_usernames([product for key, product, score in results])
+
+        return jsonify({
+            "products": products,
+            "total": total,
+            "next_offset": offset + limit if offset + limit < total else None
+        }), 200
 
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 @user_products_bp.route("/products/<int:product_id>", methods=["GET"])
+@cached_response("products", "accounts")
 def get_product(product_id):
     """Fetch a single product by ID, including the seller's username."""
     try:
-        products_db = load_json(DB_PATH_PRODUCTS)
-        product = products_db.get(str(product_id))
+        product = PRODUCTS.get(product_id)
 
         if not product:
             return jsonify({"error": "Product not found"}), 404
 
-        product["seller_username"] = get_username(product["customer_id"])
-        return jsonify({"product": product}), 200
+        return jsonify({"product": with_seller_usernames([product])[0]}), 200
 
     except Exception as e:
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
@@ -67,22 +102,16 @@ def toggle_wishlist(product_id):
     """Adds or removes a product from the wishlist for user 1 (assumption until login is implemented)."""
     try:
         user_id = "1"  # Assume user ID 1 for now
-        wishlist_db = load_json(DB_PATH_WISHLIST)
-
-        if str(product_id) not in wishlist_db:
-            wishlist_db[str(product_id)] = []
-
-        wishlist = wishlist_db[str(product_id)]
 
-        if user_id in wishlist:
-            wishlist.remove(user_id)
-            action = "removed from"
-        else:
-            wishlist.append(user_id)
-            action = "added to"
+        def toggle(wishlist):
+            if user_id in wishlist:
+                wishlist.remove(user_id)
+            else:
+                wishlist.append(user_id)
+            return wishlist
 
-        wishlist_db[str(product_id)] = wishlist
-        save_json(DB_PATH_WISHLIST, wishlist_db)
+        wishlist = WISHLIST.update(product_id, toggle, default=[])
+        action = "added to" if user_id in wishlist else "removed from"
 
         return jsonify({
             "message": f"Product {product_id} {action} wishlist for user {user_id}",
@@ -100,8 +129,7 @@ def toggle_listing(product_id):
         user = get_jwt_identity()  # Get user from JWT
         user_id = str(user["id"])
 
-        products_db = load_json(DB_PATH_PRODUCTS)
-        product = products_db.get(str(product_id))
+        product, version = PRODUCTS.get_versioned(product_id)
 
         if not product:
             return jsonify({"error": "Product not found"}), 404
@@ -109,9 +137,11 @@ def toggle_listing(product_id):
         if str(product["customer_id"]) != user_id:
             return jsonify({"error": "Permission denied"}), 403
 
-        product["is_listed"] = not product.get("is_listed", True)
-        products_db[str(product_id)] = product
-        save_json(DB_PATH_PRODUCTS, products_db)
+        product = {**product, "is_listed": not product.get("is_listed", True)}
+        try:
+            PRODUCTS.put(product_id, product, if_version=version)
+        except ConflictError:
+            return jsonify({"error": "Product was modified, please retry"}), 409
 
         return jsonify({
             "message": "Product listing status updated",
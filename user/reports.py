@@ -1,25 +1,11 @@
 from flask import Blueprint, request, jsonify
-import os
-import json
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from storage import get_collection
+from storage.ids import next_id
 
 user_reports_bp = Blueprint("user_reports", __name__)
 
-# Database path
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_REPORTS = os.path.join(DB_FOLDER, "reports.json")
-
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to a file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
+REPORTS = get_collection("reports")
 
 @user_reports_bp.route("/report-user/<int:user_id>", methods=["POST"])
 @jwt_required()
@@ -39,19 +25,15 @@ def report_user(user_id):
         if reporter == str(user_id):
             return jsonify({"error": "You cannot report yourself"}), 403
 
-        reports_db = load_json(DB_PATH_REPORTS)
-
         # Generate a new unique report ID
-        report_id = str(len(reports_db) + 1)
+        report_id = next_id(REPORTS)
 
-        reports_db[report_id] = {
+        REPORTS.put(report_id, {
             "id": report_id,
             "customerId": str(user_id),
             "reportedBy": reporter,
             "reason": reason
-        }
-
-        save_json(DB_PATH_REPORTS, reports_db)
+        })
 
         return jsonify({"message": "Report submitted successfully!"}), 200
 
@@ -1,60 +1,35 @@
 from flask import Blueprint, jsonify, request
 import os
-import json
-from werkzeug.utils import secure_filename
-from PIL import Image
+import threading
+from storage import get_collection, DELETE
+from storage.ids import next_id
+from media import store_image, release, QueueFullError, UploadRejectedError
 
 user_submissions_bp = Blueprint("user_submissions", __name__)
 
-# Database path
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_SUBMISSIONS = os.path.join(DB_FOLDER, "submissions.json")
+SUBMISSIONS = get_collection("submissions")
 
 # Upload folder
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "../api/uploads")
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+MAX_IMAGE_WIDTH = 1080
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
-
-def save_json(db_path, data):
-    """Save JSON data to a file."""
-    with open(db_path, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4)
-
 def allowed_file(filename):
     """Check if uploaded file is an allowed image format."""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def compress_image(image_path):
-    """Resize and compress image before saving."""
-    try:
-        with Image.open(image_path) as img:
-            img = img.convert("RGB")  # Ensure compatibility
-
-            # Resize if width > 1080px while keeping aspect ratio
-            max_width = 1080
-            if img.width > max_width:
-                aspect_ratio = img.height / img.width
-                new_height = int(max_width * aspect_ratio)
-                img = img.resize((max_width, new_height), Image.LANCZOS)
-
-            # Save with optimized quality
-            img.save(image_path, "JPEG", quality=85, optimize=True)
-    except Exception as e:
-        print(f"❌ Error compressing image: {e}")
-
 @user_submissions_bp.route("/submit", methods=["POST"])
 def submit_item():
     """
-    Handle item submission with file uploads and image compression.
+    Handle item submission with file uploads.
+
+    Photos are compressed in the background; the response lists the image job
+    IDs to poll at `/api/user/jobs/<job_id>`. A photo whose job fails is
+    removed from the submission's images.
     """
+    owner = None
     try:
         data = request.form.to_dict()
         files = request.files.getlist("photos")
@@ -68,36 +43,56 @@ def submit_item():
         if not files:
             return jsonify({"error": "At least one photo is required."}), 400
 
+        # Generate a new ID
+        new_id = next_id(SUBMISSIONS)
+        owner = f"submission:{new_id}"
+
         filenames = []
+        jobs = []
+        failed = set()
+        failed_lock = threading.Lock()
+
+        def image_failed(path):
+            # Either the record below is written without the path, or it already exists and loses it here
+            with failed_lock:
+                failed.add(path)
+            SUBMISSIONS.update(new_id, lambda submission: DELETE if submission is None else {
+                **submission, "images": [image for image in submission["images"] if image != path]})
+
         for file in files:
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-
-                file.save(filepath)  # Save original file
-                compress_image(filepath)  # Compress the image
+                # Stored by content hash and compressed off the request thread
+                try:
+                    filename, job_id = store_image(file, owner, MAX_IMAGE_WIDTH, on_error=image_failed)
+                except QueueFullError as e:
+                    release(owner)
+                    return jsonify({"error": str(e)}), 503
+                except UploadRejectedError as e:
+                    release(owner)
+                    return jsonify({"error": f"{file.filename}: {e}"}), e.status
 
                 filenames.append(filename)
-
-        # Load existing submissions
-        submissions_db = load_json(DB_PATH_SUBMISSIONS)
-
-        # Generate a new ID
-        new_id = str(len(submissions_db) + 1)
-
-        # Store the submission
-        submissions_db[new_id] = {
-            "clothing_name": data["title"],
-            "description": data.get("description", ""),
-            "customerId": "1",  # Assuming user ID 1 for now
-            "tags": data["selectedTags"].split(","),
-            "images": filenames,
-        }
-
-        # Save to JSON
-        save_json(DB_PATH_SUBMISSIONS, submissions_db)
-
-        return jsonify({"message": "Submission successful!"}), 200
+                if job_id:
+                    jobs.append(job_id)
+
+        def submission(existing):
+            with failed_lock:
+                images = [filename for filename in filenames if filename not in failed]
+            return {
+                "clothing_name": data["title"],
+                "description": data.get("description", ""),
+                "customerId": "1",  # Assuming user ID 1 for now
+                "tags": data["selectedTags"].split(","),
+                "images": images,
+                "image_jobs": jobs,
+            }
+
+        # Store the submission, in the same writer lock as image_failed
+        SUBMISSIONS.update(new_id, submission)
+
+        return jsonify({"message": "Submission successful!", "submission_id": new_id, "jobs": jobs}), 202
 
     except Exception as e:
+        if owner is not None:
+            release(owner)
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
\ No newline at end of file
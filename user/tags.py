@@ -1,32 +1,44 @@
-from flask import Blueprint, jsonify
-import os
-import json
+from flask import Blueprint, jsonify, request
+from storage import get_collection
+from storage.products import tag_facets, parse_filters
+from services import cached_response
 
 user_tags_bp = Blueprint("user_tags", __name__)
 
-# Database path
-DB_FOLDER = os.path.join(os.path.dirname(__file__), "../db")
-DB_PATH_TAGS = os.path.join(DB_FOLDER, "tags.json")
-
-def load_json(db_path):
-    """Load JSON data from a file."""
-    if not os.path.exists(db_path):
-        return {}
-    with open(db_path, "r", encoding="utf-8") as file:
-        return json.load(file)
+TAGS = get_collection("tags")
 
 @user_tags_bp.route("/tags", methods=["GET"])
+@cached_response("tags", max_age=60)
 def get_tags():
     """
     Fetch all available tags from the JSON database.
     """
     try:
-        tags_db = load_json(DB_PATH_TAGS)
-
         # Sort tags numerically by their ID
-        sorted_tags = sorted(tags_db.values(), key=lambda x: int(x["id"]))
+        sorted_tags = sorted(TAGS.values(), key=lambda x: int(x["id"]))
 
         return jsonify({"tags": sorted_tags}), 200
 
     except Exception as e:
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@user_tags_bp.route("/tags/facets", methods=["GET"])
+@cached_response("products")
+def get_tag_facets():
+    """
+    Count listed products per tag, for tag-faceted browsing.
+
+    Accepts the same `tags`, `any_tags` and `customer_id` filters as the
+    product catalogue, so the counts describe the current selection.
+    """
+    try:
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        filters["is_listed"] = True
+
+        return jsonify({"facets": tag_facets(**filters)}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500